@@ -0,0 +1,391 @@
+"""
+    End-to-end latency of module updates, from a client to lemonbar's stdin
+
+    Runs the real manager.py with stand-ins for lemonbar, xdo and pywal
+    (benchmarks/stubs), drives it through its API with a load profile, and
+    measures when each update reaches the (stub) lemonbar's stdin. Every
+    update carries a sequence number and its send time. An update is
+    delivered by the first frame showing it or a later value of the same
+    module: an update coalesced into a later one is timed up to the frame
+    showing that one (and counted as coalesced).
+
+    Profiles:
+        clock   a module updated at 1 Hz
+        bspwm   bursts of desktop/node updates (as fired by bspwm events)
+        flood   a module updated at 1 kHz
+
+    Reports p50/p99 latency, frames written, the manager's CPU time and RSS,
+    and saves them as JSON, to compare commits:
+        python benchmarks/end_to_end.py --profile flood --output new.json
+        python benchmarks/end_to_end.py --compare old.json new.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import statistics
+import subprocess
+from collections import deque
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PACKAGE = os.path.join(ROOT, "lemonbar_manager")
+STUBS = os.path.join(ROOT, "benchmarks", "stubs")
+
+sys.path.insert(0, PACKAGE)
+
+import protocol  # noqa: E402
+from client import Client  # noqa: E402
+
+MARKER = re.compile(r"@(\d+):(\d+)")
+
+CONFIG = """
+bar_config = {{
+    "geometry": "1920x30+0+0",
+    "fg_color": "${{foreground}}",
+    "bg_color": "${{background}}",
+    "fonts": ["monospace"],
+    "modules": {{
+        "left": {{"desktops": "%{{F${{color4}}}}...%{{F-}}"}},
+        "center": {{"node": "%{{F${{color2}}}}...%{{F-}}"}},
+        "right": {{
+            "flood": "...",
+            "clock": "%{{B${{color1}}}}...%{{B-}}",
+        }},
+    }},
+    "dir": {wallpapers!r},
+    "img": "wallpaper.png",
+    "alpha": "D0",
+    "palette_index": None,
+    "state_path": None,
+    "xlib": False,
+}}
+
+endpoint = {endpoint!r}
+update_endpoint = {update_endpoint!r}
+"""
+
+LAUNCHER = """
+import sys
+import asyncio
+
+# The benchmark's config.py (in this directory) comes first
+sys.path.insert(1, {package!r})
+
+import manager
+
+try:
+    asyncio.run(manager.main())
+except KeyboardInterrupt:
+    pass
+"""
+
+
+class Sender:
+    def __init__(self, client: Client):
+        self.client = client
+        self.seq = 0
+        # Every update sent: seq -> (module id, send time)
+        self.sent = {}
+
+    def send(self, mod_id: str):
+        self.seq += 1
+        sent = time.monotonic_ns()
+        self.sent[self.seq] = (mod_id, sent)
+
+        # Colors, so every frame goes through replace_colors
+        val = f"%{{F${{color{ self.seq % 16 }}}}}{ mod_id } @{ self.seq }:{ sent }%{{F-}}"
+        self.client.update_mod(mod_id, val)
+
+
+def paced(rate: float, duration: float):
+    """ Yields at a sustained rate, without drifting """
+
+    period = 1 / rate
+    start = deadline = time.monotonic()
+
+    while deadline - start < duration:
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        yield
+        deadline += period
+
+
+def clock(sender: Sender, duration: float):
+    for _ in paced(1, duration):
+        sender.send("clock")
+
+
+def bspwm(sender: Sender, duration: float, burst: int = 12):
+    # Switching desktops fires a handful of events at once
+    for _ in paced(2, duration):
+        for i in range(burst):
+            sender.send("desktops" if i % 3 else "node")
+
+
+def flood(sender: Sender, duration: float):
+    for _ in paced(1000, duration):
+        sender.send("flood")
+
+
+PROFILES = {"clock": clock, "bspwm": bspwm, "flood": flood}
+
+
+def cpu_time(pid: int) -> float:
+    """ User + system CPU seconds of a process """
+
+    with open(f"/proc/{ pid }/stat") as f:
+        # Fields after the command name (which may contain spaces)
+        fields = f.read().rsplit(")", 1)[1].split()
+
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def memory(pid: int):
+    """ (current, peak) resident set size in kB """
+
+    rss = hwm = 0
+
+    with open(f"/proc/{ pid }/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+            elif line.startswith("VmHWM:"):
+                hwm = int(line.split()[1])
+
+    return rss, hwm
+
+
+def wait_ready(client: Client, manager: subprocess.Popen, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline and manager.poll() is None:
+        try:
+            client.request("get_mods")
+            return
+        except TimeoutError:
+            pass
+
+    raise RuntimeError("The manager didn't start")
+
+
+def percentile(samples, q):
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def deliver(frames_log: str, skip: int, sent):
+    """
+        Matches the updates sent (seq -> (module id, send time)) with the frames
+        logged after the first `skip` ones
+
+        Returns (latencies in ms, updates shown in a frame, frames).
+    """
+
+    # Each module's updates not delivered yet, oldest first
+    pending = {}
+    for seq, (mod_id, _) in sorted(sent.items()):
+        pending.setdefault(mod_id, deque()).append(seq)
+
+    latencies = []
+    shown = frames = 0
+
+    with open(frames_log) as f:
+        for i, line in enumerate(f):
+            if i < skip:
+                continue
+
+            frames += 1
+            arrival, *markers = line.split()
+
+            for marker in markers:
+                seq, _ = MARKER.match(marker).groups()
+                seq = int(seq)
+
+                if seq not in sent:
+                    # Sent before the measure
+                    continue
+
+                queue = pending[sent[seq][0]]
+                if not queue or queue[0] > seq:
+                    # Already delivered (a marker stays until the next update)
+                    continue
+
+                shown += 1
+
+                # Delivers this update and every older one it replaced
+                while queue and queue[0] <= seq:
+                    old = queue.popleft()
+                    latencies.append((int(arrival) - sent[old][1]) / 1e6)
+
+    return latencies, shown, frames
+
+
+def run(profile: str, duration: float, fmt: str):
+    tmp = tempfile.mkdtemp(prefix="lemonbar-bench-")
+
+    try:
+        return _run(tmp, profile, duration, fmt)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _run(tmp: str, profile: str, duration: float, fmt: str):
+
+    wallpapers = os.path.join(tmp, "wallpapers")
+    os.mkdir(wallpapers)
+    open(os.path.join(wallpapers, "wallpaper.png"), "wb").close()
+
+    endpoint = f"ipc://{ tmp }/api.sock"
+    update_endpoint = f"ipc://{ tmp }/updates.sock"
+    frames_log = os.path.join(tmp, "frames.log")
+
+    with open(os.path.join(tmp, "config.py"), "w") as f:
+        f.write(CONFIG.format(
+            wallpapers=wallpapers, endpoint=endpoint, update_endpoint=update_endpoint))
+
+    launcher = os.path.join(tmp, "run_manager.py")
+    with open(launcher, "w") as f:
+        f.write(LAUNCHER.format(package=PACKAGE))
+
+    env = {
+        **os.environ,
+        "PATH": f"{ STUBS }:{ os.environ.get('PATH', '') }",
+        "PYTHONPATH": os.pathsep.join(filter(None, (STUBS, os.environ.get("PYTHONPATH")))),
+        "BENCH_FRAMES_LOG": frames_log,
+        "XDG_CACHE_HOME": tmp,
+    }
+    manager = subprocess.Popen([sys.executable, launcher], env=env)
+
+    client = Client(endpoint, fmt=fmt, timeout=1)
+
+    try:
+        wait_ready(client, manager)
+        # Startup frames aren't part of the measure
+        time.sleep(0.5)
+        frames_before = _count_lines(frames_log)
+
+        sender = Sender(client)
+        cpu_before = cpu_time(manager.pid)
+        start = time.monotonic()
+
+        PROFILES[profile](sender, duration)
+
+        # Let the last frames through
+        time.sleep(0.2)
+        elapsed = time.monotonic() - start
+        cpu = cpu_time(manager.pid) - cpu_before
+        rss, max_rss = memory(manager.pid)
+
+        flush_stats = client.request("get_flush_stats")
+        stage_stats = client.request("get_stats")
+    finally:
+        client.close()
+        manager.send_signal(signal.SIGINT)
+        manager.wait(10)
+
+    latencies, shown, frames = deliver(frames_log, frames_before, sender.sent)
+    latencies.sort()
+
+    return {
+        "profile": profile,
+        "commit": git_commit(),
+        "format": fmt,
+        "duration": elapsed,
+        "sent": sender.seq,
+        "delivered": len(latencies),
+        # Delivered by a frame showing a later value
+        "coalesced": len(latencies) - shown,
+        "lost": sender.seq - len(latencies),
+        "frames": frames,
+        "latency_ms": {
+            "p50": percentile(latencies, .5) if latencies else None,
+            "p99": percentile(latencies, .99) if latencies else None,
+            "max": latencies[-1] if latencies else None,
+            "mean": statistics.fmean(latencies) if latencies else None,
+        },
+        "cpu_s": cpu,
+        "cpu_percent": cpu / elapsed * 100,
+        "rss_kb": rss,
+        "max_rss_kb": max_rss,
+        "flush": flush_stats,
+        # p50/p99 of each stage (ipc.*, bar.execute, flush.*, ...), as seen by the manager
+        "stages": {
+            name: {"p50_ms": hist["p50_ms"], "p99_ms": hist["p99_ms"], "avg_ms": hist["avg_ms"]}
+            for name, hist in stage_stats.get("histograms", {}).items()
+        },
+    }
+
+
+def _count_lines(path):
+    try:
+        with open(path) as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def _flatten(obj, prefix=""):
+    for key, val in obj.items():
+        if isinstance(val, dict):
+            yield from _flatten(val, f"{ prefix }{ key }.")
+        elif isinstance(val, (int, float)) and not isinstance(val, bool):
+            yield f"{ prefix }{ key }", val
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = dict(_flatten(json.load(f)))
+    with open(new_path) as f:
+        new = dict(_flatten(json.load(f)))
+
+    print(f"{ 'metric':<28} { 'old':>12} { 'new':>12} { 'change':>9}")
+    for key in old:
+        if key not in new:
+            continue
+
+        change = f"{ (new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else ""
+        print(f"{ key:<28} { old[key]:>12.3f} { new[key]:>12.3f} { change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", choices=PROFILES, default="clock")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--binary", action="store_true", help="use the binary protocol")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two saved results instead")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    res = run(args.profile, args.duration, protocol.BINARY if args.binary else protocol.JSON)
+
+    print(json.dumps(res, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(res, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
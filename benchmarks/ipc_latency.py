@@ -0,0 +1,116 @@
+"""
+    Round-trip latency of update_mod over TCP vs. IPC
+
+    A ROUTER server (in its own process, like the manager) replies `{}` to
+    every request, while a REQ client sends update_mod messages at a
+    sustained rate (1 kHz by default) and records each round trip.
+
+    Usage:
+        python benchmarks/ipc_latency.py [--rate 1000] [--duration 10]
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+import zmq
+
+
+def serve(endpoint, ready):
+    ctx = zmq.Context()
+    sock = ctx.socket(zmq.ROUTER)
+    sock.bind(endpoint)
+    ready.set()
+
+    while True:
+        *envelope, payload = sock.recv_multipart()
+        obj = json.loads(payload)
+
+        if obj.get("cmd") == "stop":
+            sock.send_multipart([*envelope, b"{}"])
+            break
+
+        sock.send_multipart([*envelope, json.dumps({}).encode()])
+
+    ctx.destroy()
+
+
+def run(endpoint, rate, duration):
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(endpoint, ready))
+    server.start()
+    ready.wait()
+
+    ctx = zmq.Context()
+    sock = ctx.socket(zmq.REQ)
+    sock.connect(endpoint)
+
+    period = 1 / rate
+    samples = []
+
+    start = time.perf_counter()
+    deadline = start
+
+    while deadline - start < duration:
+        # Pace the load, without drifting
+        deadline += period
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        msg = {"cmd": "update_mod", "key": "date_time", "val": time.strftime("%H:%M:%S")}
+
+        t0 = time.perf_counter_ns()
+        sock.send_json(msg)
+        sock.recv_json()
+        samples.append(time.perf_counter_ns() - t0)
+
+    elapsed = time.perf_counter() - start
+
+    sock.send_json({"cmd": "stop"})
+    sock.recv_json()
+    ctx.destroy()
+    server.join()
+
+    samples.sort()
+
+    return {
+        "endpoint": endpoint,
+        "messages": len(samples),
+        "rate": len(samples) / elapsed,
+        "mean_us": statistics.fmean(samples) / 1000,
+        "p50_us": samples[len(samples) // 2] / 1000,
+        "p99_us": samples[int(len(samples) * .99)] / 1000,
+        "max_us": samples[-1] / 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=1000, help="messages per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per transport")
+    parser.add_argument("--port", type=int, default=5599)
+    args = parser.parse_args()
+
+    sock_path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+
+    results = [
+        run(f"tcp://127.0.0.1:{ args.port }", args.rate, args.duration),
+        run(f"ipc://{ sock_path }", args.rate, args.duration),
+    ]
+
+    print(f"{ 'endpoint':<40} { 'msgs':>7} { 'rate':>8} { 'mean':>9} { 'p50':>9} { 'p99':>9} { 'max':>9}")
+    for res in results:
+        print(
+            f"{ res['endpoint']:<40} { res['messages']:>7} { res['rate']:>8.0f}"
+            f" { res['mean_us']:>7.1f}us { res['p50_us']:>7.1f}us"
+            f" { res['p99_us']:>7.1f}us { res['max_us']:>7.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+    Per-message cost of the manager protocol: JSON vs. binary
+
+    Measures, for an update_mod message:
+        - encode: client side request encoding
+        - decode: server side request decoding
+        - dispatch: Bar.parse through the precomputed command table
+        - reply: encoding the reply
+
+    Usage:
+        python benchmarks/protocol.py [--count 100000]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lemonbar_manager"))
+
+import protocol  # noqa: E402
+from bar import Bar  # noqa: E402
+
+
+def per_message(fn, count):
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter_ns() - start) / count
+
+
+async def bench(count):
+    # No lemonbar is started: frames are scheduled but never rendered
+    bar = Bar(
+        dir=tempfile.mkdtemp(), img="none.png", palette_index=None, state_path=None,
+        modules={"right": {"date_time": ""}},
+    )
+
+    obj = {"cmd": "update_mod", "key": "date_time", "val": "%{O10}Sun 18 Oct 12:00:00%{O10}"}
+
+    results = {}
+
+    for fmt in (protocol.JSON, protocol.BINARY):
+        payload = protocol.encode_request(obj, fmt)
+        decoded, _ = protocol.decode_request(payload)
+
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            await bar.parse(decoded)
+        dispatch = (time.perf_counter_ns() - start) / count
+
+        results[fmt] = {
+            "size": len(payload),
+            "encode": per_message(lambda: protocol.encode_request(obj, fmt), count),
+            "decode": per_message(lambda: protocol.decode_request(payload), count),
+            "dispatch": dispatch,
+            "reply": per_message(lambda: protocol.encode_reply({}, fmt), count),
+        }
+
+    bar.flusher.cancel()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args.count))
+
+    print(f"{ 'format':<8} { 'bytes':>6} { 'encode':>9} { 'decode':>9} { 'dispatch':>9} { 'reply':>9}")
+    for fmt, res in results.items():
+        print(
+            f"{ fmt:<8} { res['size']:>6}"
+            f" { res['encode']:>7.0f}ns { res['decode']:>7.0f}ns"
+            f" { res['dispatch']:>7.0f}ns { res['reply']:>7.0f}ns"
+        )
+
+
+if __name__ == "__main__":
+    main()
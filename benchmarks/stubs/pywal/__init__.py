@@ -0,0 +1,3 @@
+""" Stand-in for pywal: a fixed palette, no wallpaper setting """
+
+from . import colors, wallpaper  # noqa: F401
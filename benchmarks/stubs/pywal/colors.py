@@ -0,0 +1,11 @@
+def get(img_path):
+    return {
+        "wallpaper": img_path,
+        "alpha": "100",
+        "special": {
+            "background": "#1d1f21",
+            "foreground": "#c5c8c6",
+            "cursor": "#c5c8c6",
+        },
+        "colors": {f"color{ i }": f"#{ i * 0x111111:06x}" for i in range(16)},
+    }
@@ -0,0 +1,2 @@
+def change(img_path):
+    pass
@@ -0,0 +1,99 @@
+"""
+    Finding & stacking lemonbar's window: python-xlib vs. xdo
+
+    Starts a decoy lemonbar (so there are several to tell apart), then
+    repeatedly starts a lemonbar and times how long each backend takes to
+    find its window (by its unique WM_NAME) and put it at the bottom of
+    the stack. Checks that the right window was found and ends up lowest.
+
+    Needs an X server, lemonbar, xdo and python-xlib, e.g.:
+        xvfb-run python benchmarks/x11_stacking.py [--runs 20]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lemonbar_manager"))
+
+from bar import Bar  # noqa: E402
+
+
+async def spawn(wm_name: str):
+    ps = await asyncio.create_subprocess_exec(
+        "lemonbar", "-g", "200x20+0+0", "-n", wm_name, stdin=asyncio.subprocess.PIPE)
+    ps.stdin.write(b"bench\n")
+    await ps.stdin.drain()
+    return ps
+
+
+async def run(bar: Bar, runs: int):
+    samples = []
+
+    for i in range(runs):
+        wm_name = f"bench-{ os.getpid() }-{ i }"
+        ps = await spawn(wm_name)
+
+        t0 = time.perf_counter_ns()
+        win = await bar.wait_for_window(wm_name)
+        await bar.fix_lemonbar(win)
+        samples.append(time.perf_counter_ns() - t0)
+
+        if bar.x11 is not None:
+            # Right window, now the lowest one
+            win_id = int(win, 0) if isinstance(win, str) else win
+            conn = bar.x11
+            name = conn._get_name(conn.display.create_resource_object("window", win_id))
+            lowest = conn.root.query_tree().children[0].id
+            assert name == wm_name, f"found { name }, expected { wm_name }"
+            assert lowest == win_id, "window isn't at the bottom of the stack"
+
+        await bar.close_bar(ps)
+
+    samples.sort()
+
+    return {
+        "backend": "xlib" if bar.x11 is not None else "xdo",
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples) / 1e6,
+        "p50_ms": samples[len(samples) // 2] / 1e6,
+        "max_ms": samples[-1] / 1e6,
+    }
+
+
+async def main_async(runs: int):
+    xlib_bar = Bar(img="none.png", palette_index=None, state_path=None, xlib=True)
+    if xlib_bar.connect_x11() is None:
+        sys.exit("python-xlib can't connect to the display")
+
+    xdo_bar = Bar(img="none.png", palette_index=None, state_path=None, xlib=False)
+
+    decoy = await spawn("lemonbar")
+
+    try:
+        results = [await run(xlib_bar, runs), await run(xdo_bar, runs)]
+    finally:
+        xlib_bar.x11.close()
+        await xlib_bar.close_bar(decoy)
+
+    print(f"{ 'backend':<8} { 'runs':>5} { 'mean':>9} { 'p50':>9} { 'max':>9}")
+    for res in results:
+        print(
+            f"{ res['backend']:<8} { res['runs']:>5}"
+            f" { res['mean_ms']:>7.1f}ms { res['p50_ms']:>7.1f}ms { res['max_ms']:>7.1f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import json
+import shlex
+import asyncio
+import inspect
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from providers import run_command
+
+Action = Union[List[str], Callable[[str], None]]
+
+
+class ActionDispatcher:
+    """
+        Runs the click actions lemonbar prints on its stdout (`%{A:...:}`)
+
+        An action is dispatched, in order of precedence, to:
+            - `{"cmd": ...}`: the API, like an IPC request
+            - `<name> <args>`: the action registered as `name`, either an
+              in-process callable (receiving the args) or a command (run
+              with the args appended)
+            - the shell, only if `shell` (like `lemonbar | sh`)
+
+        Each lemonbar's stdout has its own reader, which lasts until that
+        lemonbar exits: a bar being replaced by a reload stays clickable
+        until it's closed.
+    """
+
+    def __init__(self, api: Optional[Callable[[Dict], Awaitable[Dict]]] = None, *,
+                 shell: bool = False,
+                 ):
+        self.api = api
+        self.shell = shell
+        self.actions: Dict[str, Action] = {}
+        self.readers = set()
+        self.running = set()
+
+        # Counters
+        self.clicks = 0
+        self.api_calls = 0
+        self.handled = 0
+        self.shell_runs = 0
+        self.unknown = 0
+        self.failed = 0
+
+    def register(self, name: str, action: Action):
+        self.actions[name] = action
+
+    def attach(self, stdout: asyncio.StreamReader):
+        """ Reads a new lemonbar's actions until it exits """
+
+        reader = asyncio.create_task(self._read(stdout))
+        self.readers.add(reader)
+        reader.add_done_callback(self.readers.discard)
+
+    async def _read(self, stdout: asyncio.StreamReader):
+        while True:
+            line = await stdout.readline()
+            if not line:
+                break
+
+            action = line.decode(errors="replace").rstrip("\n")
+            if action:
+                # A slow action doesn't hold back the next clicks
+                task = asyncio.create_task(self.dispatch(action))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+
+    async def dispatch(self, action: str):
+        self.clicks += 1
+
+        try:
+            await self._dispatch(action)
+        except Exception as err:
+            self.failed += 1
+            print(f"Action { action } failed: { err }")
+
+    async def _dispatch(self, action: str):
+        if action.startswith("{") and self.api is not None:
+            self.api_calls += 1
+
+            rep = await self.api(json.loads(action))
+            if isinstance(rep, dict) and "error" in rep:
+                raise ValueError(rep["error"])
+            return
+
+        name, _, args = action.partition(" ")
+
+        if name in self.actions:
+            self.handled += 1
+            target = self.actions[name]
+
+            if callable(target):
+                rep = target(args)
+                if inspect.isawaitable(rep):
+                    await rep
+            else:
+                await run_command([*target, *shlex.split(args)])
+            return
+
+        if self.shell:
+            self.shell_runs += 1
+
+            ps = await asyncio.create_subprocess_shell(action)
+            await ps.wait()
+            return
+
+        self.unknown += 1
+        print(f"Unknown action: { action }")
+
+    async def close(self):
+        """ Waits for the readers (their lemonbars have been closed) and their last actions """
+
+        await asyncio.gather(*self.readers, return_exceptions=True)
+        await asyncio.gather(*self.running, return_exceptions=True)
+
+    def get_stats(self):
+        return {
+            "actions": sorted(self.actions),
+            "shell": self.shell,
+            "readers": len(self.readers),
+            "running": len(self.running),
+            "clicks": self.clicks,
+            "api_calls": self.api_calls,
+            "handled": self.handled,
+            "shell_runs": self.shell_runs,
+            "unknown": self.unknown,
+            "failed": self.failed,
+        }
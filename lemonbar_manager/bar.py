@@ -1,10 +1,20 @@
 import os
+import time
 import asyncio
 from random import choice
-from functools import reduce
 from typing import Optional, Dict, List
 
-import pywal
+import stats
+import template
+import startup
+from palette import (
+    DEFAULT_INDEX_PATH, PaletteCache, PaletteIndex, build_palette, change_wallpaper,
+)
+from state import DEFAULT_STATE_PATH, StateWriter, load_state, restore_settings
+from modules import ModuleRegistry
+from flush import FlushScheduler
+from actions import ActionDispatcher
+from commands import ACCESSOR, MUTATOR, Command, CommandRegistry, command
 
 
 class Wallpaper:
@@ -13,97 +23,126 @@ class Wallpaper:
                      os.path.expanduser("~"), "wallpapers"),
                  img: Optional[str] = None,
                  alpha: Optional[str] = "FF",
+                 palette_cache: Optional[PaletteCache] = None,
+                 index: Optional[PaletteIndex] = None,
                  ):
         self.dir = dir
+        self.index = index
         self.img = (
             img
             if img is not None else
-            choice(os.listdir(dir))
+            self.random_img()
         )
         self.alpha = alpha
 
+        self.palette_cache = (
+            palette_cache
+            if palette_cache is not None else
+            PaletteCache(index)
+        )
+        # (colors, palette) in use; kept until a new one is ready
+        self._palette = None
+        self._stale = True
+
+    def invalidate(self):
+        self._stale = True
+
+    def get_img_path(self):
+        return os.path.join(self.dir, self.img)
+
     def set_dir(self, dir):
         self.dir = dir
+        if self.index is not None:
+            self.index.set_dir(dir)
+        self.invalidate()
 
     def get_dir(self):
         return self.dir
 
     def set_img(self, img):
         self.img = img
+        self.invalidate()
 
     def get_img(self):
         return self.img
 
     def set_alpha(self, alpha):
         self.alpha = alpha
+        self.invalidate()
 
     def get_alpha(self):
         return self.alpha
 
+    def random_img(self):
+        if self.index is not None:
+            return self.index.random_img()
+
+        return choice(os.listdir(self.dir))
+
     def set_random_img(self):
-        self.img = choice(os.listdir(self.dir))
+        self.img = self.random_img()
+        self.invalidate()
 
-    def config_wallpaper(self):
-        img_path = os.path.join(self.dir, self.img)
+    async def config_wallpaper(self):
+        img_path = self.get_img_path()
 
         if os.path.isfile(img_path):
-            pywal.wallpaper.change(img_path)
+            # pywal blocks, keep it off the event loop
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, change_wallpaper, img_path)
 
-    def get_colors(self):
-        img_path = os.path.join(self.dir, self.img)
-        return pywal.colors.get(img_path)
+    async def load_palette(self):
+        """
+            Computes the current image's palette in a worker thread
 
-    def replace_colors(self, string):
-        colors = self.get_colors()
-        colors = {
-            "foreground": colors["special"]["foreground"],
-            "background": colors["special"]["background"],
-            "color0": colors["colors"]["color0"],
-            "color1": colors["colors"]["color1"],
-            "color2": colors["colors"]["color2"],
-            "color3": colors["colors"]["color3"],
-            "color4": colors["colors"]["color4"],
-            "color5": colors["colors"]["color5"],
-            "color6": colors["colors"]["color6"],
-            "color7": colors["colors"]["color7"],
-            "color8": colors["colors"]["color8"],
-            "color9": colors["colors"]["color9"],
-            "color10": colors["colors"]["color10"],
-            "color11": colors["colors"]["color11"],
-            "color12": colors["colors"]["color12"],
-            "color13": colors["colors"]["color13"],
-            "color14": colors["colors"]["color14"],
-            "color15": colors["colors"]["color15"],
-        }
+            Until it's ready, the previous palette stays in use; it's then
+            swapped in at once (unless the image/alpha changed meanwhile).
+        """
 
-        # Insert alpha
-        for key in colors.keys():
-            colors[key] = colors[key][0] + self.alpha + colors[key][1:]
-
-        # replace colors
-        string = (
-            string
-            .replace("${foreground}", colors["foreground"])
-            .replace("${background}", colors["background"])
-            .replace("${color0}", colors["color0"])
-            .replace("${color1}", colors["color1"])
-            .replace("${color2}", colors["color2"])
-            .replace("${color3}", colors["color3"])
-            .replace("${color4}", colors["color4"])
-            .replace("${color5}", colors["color5"])
-            .replace("${color6}", colors["color6"])
-            .replace("${color7}", colors["color7"])
-            .replace("${color8}", colors["color8"])
-            .replace("${color9}", colors["color9"])
-            .replace("${color10}", colors["color10"])
-            .replace("${color11}", colors["color11"])
-            .replace("${color12}", colors["color12"])
-            .replace("${color13}", colors["color13"])
-            .replace("${color14}", colors["color14"])
-            .replace("${color15}", colors["color15"])
-        )
+        if not self._stale:
+            return
+
+        img_path, alpha = self.get_img_path(), self.alpha
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        entry = await loop.run_in_executor(
+            None, self.palette_cache.get, img_path, alpha)
+        stats.observe("palette.load", time.perf_counter() - start)
+
+        if (img_path, alpha) == (self.get_img_path(), self.alpha):
+            self._palette = entry
+            self._stale = False
+
+    def _get_palette(self):
+        if self._palette is None:
+            # Nothing loaded yet, there's no previous palette to fall back to
+            # (this blocks the event loop)
+            start = time.perf_counter()
+            self._palette = self.palette_cache.get(self.get_img_path(), self.alpha)
+            self._stale = False
+            stats.observe("palette.blocking_load", time.perf_counter() - start)
+
+        return self._palette
+
+    def has_palette(self):
+        return self._palette is not None
 
-        return string
+    def seed_palette(self, colors):
+        """ Uses `colors` until the current image's palette is loaded """
+
+        self._palette = (colors, build_palette(colors, self.alpha))
+
+    def get_colors(self):
+        colors, _ = self._get_palette()
+        return colors
+
+    def get_palette(self):
+        _, palette = self._get_palette()
+        return palette
+
+    def replace_colors(self, string):
+        return template.replace_colors(string, self.get_palette())
 
 
 class Bar:
@@ -123,460 +162,314 @@ class Bar:
                      os.path.expanduser("~"), "wallpapers"),
                  img: Optional[str] = None,
                  alpha: Optional[str] = "FF",
+                 palette_index: Optional[str] = DEFAULT_INDEX_PATH,
+                 flush_window: Optional[float] = 0.01,
+                 max_fps: Optional[float] = 30,
+                 fast_start: Optional[bool] = True,
+                 state_path: Optional[str] = DEFAULT_STATE_PATH,
+                 state_delay: Optional[float] = 30,
+                 xlib: Optional[bool] = True,
+                 wallpaper: Optional[Wallpaper] = None,
+                 actions: Optional[ActionDispatcher] = None,
                  ):
 
-        self.wallpaper = Wallpaper(dir=dir, img=img, alpha=alpha)
-        self.wallpaper.config_wallpaper()
-
-        self.options = {
+        # Settings changed at runtime survive restarts (see restore_settings)
+        self.config = {
             "-g": geometry,
             "-B": bg_color,
             "-F": fg_color,
             "-o": offset,
             "-U": u_color,
             "-u": u_pixels,
+            "fonts": list(fonts),
+            "font_size": font_size,
+            "dir": dir,
+            "img": img,
+            "alpha": alpha,
+        }
+        state = load_state(state_path)
+        settings = restore_settings(self.config, state)
+
+        # The last wallpaper may have been deleted since
+        if settings["img"] is not None and not os.path.isfile(
+                os.path.join(settings["dir"], settings["img"])):
+            settings["img"] = img
+
+        # Bars on other outputs share the first one's wallpaper (and palettes)
+        self.owns_wallpaper = wallpaper is None
+        self.wallpaper = wallpaper if wallpaper is not None else Wallpaper(
+            dir=settings["dir"], img=settings["img"], alpha=settings["alpha"],
+            index=PaletteIndex(settings["dir"], palette_index),
+        )
+        self.index_task = None
+
+        self.options = {
+            flag: settings[flag]
+            for flag in ("-g", "-B", "-F", "-o", "-U", "-u")
         }
 
-        self.font_size = font_size
-        self.fonts = fonts
+        self.font_size = settings["font_size"]
+        self.fonts = list(settings["fonts"])
 
         self.on_bottom = on_bottom
 
-        self.modules = modules
+        self.modules = ModuleRegistry(modules)
+        self._palette = None
 
         self.cmd = ["lemonbar"]
         self.ps = None
 
-    def set_opt(self, key, val):
-        if key in self.options.keys():
-            self.options[key] = val
-
-    def get_opt(self, key):
-        return self.options.get(key)
-
-    def add_font(self, font):
-        if font not in self.fonts:
-            self.fonts.append(font)
-
-    def remove_font(self, font):
-        if font in self.fonts:
-            self.fonts.remove(font)
-
-    def get_fonts(self):
-        return "\n".join(self.fonts)
-
-    def clear_fonts(self):
-        self.fonts.clear()
-
-    def set_font_size(self, new_size):
-        self.font_size = new_size
-
-    def get_font_size(self):
-        return self.font_size
-
-    def set_wallpaper(self, img_path):
-        self.wallpaper.set_img(img_path)
-        self.wallpaper.config_wallpaper()
-
-    def set_random_wallpaper(self):
-        self.wallpaper.set_random_img()
-        self.wallpaper.config_wallpaper()
-
-    def get_wallpaper(self):
-        return self.wallpaper.get_img()
-
-    def get_theme_colors(self):
-        return self.wallpaper.get_colors()
-
-    def update_mod(self, mod_id, mod_val):
-        if mod_id in self.modules.get("before_left", {}).keys():
-            self.modules["before_left"][mod_id] = mod_val
-        elif mod_id in self.modules.get("left", {}).keys():
-            self.modules["left"][mod_id] = mod_val
-        elif mod_id in self.modules.get("center", {}).keys():
-            self.modules["center"][mod_id] = mod_val
-        elif mod_id in self.modules.get("right", {}).keys():
-            self.modules["right"][mod_id] = mod_val
-
-    async def parse(self, obj):
-        cmd = obj.get("cmd")
-        key = obj.get("key")
-        val = obj.get("val")
-
-        # Assume no reply
-        rep = None
-
-        api_mutators = {
-
-            # Sets lemonbar's global option
-            "set_opt": lambda: self.set_opt(key, val),
-
-            # Add a font
-            "add_font": lambda: self.add_font(val),
-
-            # Remove a font
-            "remove_font": lambda: self.remove_font(val),
-
-            # Clear all fonts
-            "clear_fonts": self.clear_fonts,
-
-            # Set font size
-            "set_font_size": lambda: self.set_font_size(val),
-
-            # Set wallpaper
-            "set_wallpaper": lambda: self.set_wallpaper(val),
-
-            # Set random wallpaper
-            "set_random_wallpaper": self.set_random_wallpaper,
-
-            # Set alpha
-            "set_alpha": lambda: self.wallpaper.set_alpha(val),
-
+        # Background reloads
+        self.reload_task = None
+        self.running_cmd = None
+        # Each lemonbar gets its own WM_NAME, to find its window
+        self.spawned = 0
+        self.retiring = []
+        self.root_win = None
+        # In-process stacking (python-xlib), connected on first use
+        self.use_xlib = xlib
+        self.x11 = None
+        self.reload_stats = {
+            "count": 0, "cancelled": 0, "failed": 0, "last": 0.0, "max": 0.0, "total": 0.0,
         }
 
-        api_accessors = {
+        # Click actions printed by lemonbar (possibly shared with other bars)
+        self.owns_actions = actions is None
+        self.actions = actions if actions is not None else ActionDispatcher(self.parse)
 
-            # Get lemonbar's global option
-            "get_opt": lambda: self.get_opt(key),
+        self.flusher = FlushScheduler(
+            self.build_modules, window=flush_window, max_fps=max_fps)
 
-            # Get all fonts
-            "get_fonts": self.get_fonts,
+        # Built once: every @command method, plus commands
+        # registered later by other components (timers, subscriptions, ...)
+        self.commands = CommandRegistry(self)
 
-            # Get font size
-            "get_font_size": self.get_font_size,
+        self.fast_start = fast_start
+        self.startup_task = None
 
-            # Get wallpaper
-            "get_wallpaper": self.get_wallpaper,
+        self.restore_state(state)
+        self.state_writer = StateWriter(self.snapshot_state, state_path, delay=state_delay)
 
-            # Get theme colors
-            "get_colors": self.get_theme_colors,
+        startup.mark("bar_init")
 
-            # Get alpha
-            "get_alpha": self.wallpaper.get_alpha,
+    def restore_state(self, state):
+        """ Restores the last run's module values & palette, so the first frame is complete """
 
-        }
+        for mod_id, mod_val in state.get("modules", {}).items():
+            if mod_id in self.modules:
+                self.modules.update(mod_id, mod_val)
 
-        if cmd in api_mutators.keys():
-            api_mutators[cmd]()
-            await self.reload_bar()
-        elif cmd in api_accessors.keys():
-            rep = api_accessors[cmd]()
-            # In case it's a color
-            rep = self.wallpaper.replace_colors(rep)
-        elif cmd == "update_mod":
-            self.update_mod(key, val)
-            self.flush_mods()
-        else:
-            # Unknown cmd
-            rep = {"error": f"Unknown command: { cmd }"}
-
-        return rep or {}
+        if not self.fast_start or not self.owns_wallpaper:
+            return
 
-    def build_cmd(self):
-        options = []
-
-        for key, val in self.options.items():
-            options.append(key)
-
-            if key in ("-F", "-B", "-U"):
-                val = self.wallpaper.replace_colors(val)
-            options.append(val)
-
-        if self.on_bottom:
-            options.append("-b")
-
-        fonts = [
-            f"-f {font}:size={self.font_size}"
-            for font in self.fonts
-        ]
-
-        return [*self.cmd, *options, *fonts]
-
-    def build_modules(self):
-        before_left = "".join(self.modules.get("before_left", {}).values())
-        left = "".join(self.modules.get("left", {}).values())
-        center = "".join(self.modules.get("center", {}).values())
-        right = "".join(self.modules.get("right", {}).values())
-
-        complete = f"{before_left}%{{l}}{left}%{{c}}{center}%{{r}}{right}"
-        complete = self.wallpaper.replace_colors(complete)
-
-        return complete
-
-    def flush_mods(self):
-        if self.ps is not None:import os
-import asyncio
-from random import choice
-from functools import reduce
-from typing import Optional, Dict, List
-
-import pywal
-
-
-class Wallpaper:
-    def __init__(self, *,
-                 dir: Optional[str] = os.path.join(
-                     os.path.expanduser("~"), "wallpapers"),
-                 img: Optional[str] = None,
-                 alpha: Optional[str] = "FF",
-                 ):
-        self.dir = dir
-        self.img = (
-            img
-            if img is not None else
-            choice(os.listdir(dir))
+        # The current image's indexed colors, else the last run's as a stand-in
+        colors = (
+            self.wallpaper.index.lookup(self.wallpaper.get_img_path()) or
+            state.get("colors")
         )
-        self.alpha = alpha
-
-    def set_dir(self, dir):
-        self.dir = dir
-
-    def get_dir(self):
-        return self.dir
-
-    def set_img(self, img):
-        self.img = img
-
-    def get_img(self):
-        return self.img
-
-    def set_alpha(self, alpha):
-        self.alpha = alpha
-
-    def get_alpha(self):
-        return self.alpha
-
-    def set_random_img(self):
-        self.img = choice(os.listdir(self.dir))
-
-    def config_wallpaper(self):
-        img_path = os.path.join(self.dir, self.img)
-
-        if os.path.isfile(img_path):
-            pywal.wallpaper.change(img_path)
-
-    def get_colors(self):
-        img_path = os.path.join(self.dir, self.img)
-        return pywal.colors.get(img_path)
-
-    def replace_colors(self, string):
-        colors = self.get_colors()
-        colors = {
-            "foreground": colors["special"]["foreground"],
-            "background": colors["special"]["background"],
-            "color0": colors["colors"]["color0"],
-            "color1": colors["colors"]["color1"],
-            "color2": colors["colors"]["color2"],
-            "color3": colors["colors"]["color3"],
-            "color4": colors["colors"]["color4"],
-            "color5": colors["colors"]["color5"],
-            "color6": colors["colors"]["color6"],
-            "color7": colors["colors"]["color7"],
-            "color8": colors["colors"]["color8"],
-            "color9": colors["colors"]["color9"],
-            "color10": colors["colors"]["color10"],
-            "color11": colors["colors"]["color11"],
-            "color12": colors["colors"]["color12"],
-            "color13": colors["colors"]["color13"],
-            "color14": colors["colors"]["color14"],
-            "color15": colors["colors"]["color15"],
+        if colors:
+            self.wallpaper.seed_palette(colors)
+
+    def get_settings(self):
+        return {
+            **self.options,
+            "fonts": list(self.fonts),
+            "font_size": self.font_size,
+            "dir": self.wallpaper.get_dir(),
+            "img": self.wallpaper.get_img(),
+            "alpha": self.wallpaper.get_alpha(),
         }
 
-        # Insert alpha
-        for key in colors.keys():
-            colors[key] = colors[key][0] + self.alpha + colors[key][1:]
-
-        # replace colors
-        string = (
-            string
-            .replace("${foreground}", colors["foreground"])
-            .replace("${background}", colors["background"])
-            .replace("${color0}", colors["color0"])
-            .replace("${color1}", colors["color1"])
-            .replace("${color2}", colors["color2"])
-            .replace("${color3}", colors["color3"])
-            .replace("${color4}", colors["color4"])
-            .replace("${color5}", colors["color5"])
-            .replace("${color6}", colors["color6"])
-            .replace("${color7}", colors["color7"])
-            .replace("${color8}", colors["color8"])
-            .replace("${color9}", colors["color9"])
-            .replace("${color10}", colors["color10"])
-            .replace("${color11}", colors["color11"])
-            .replace("${color12}", colors["color12"])
-            .replace("${color13}", colors["color13"])
-            .replace("${color14}", colors["color14"])
-            .replace("${color15}", colors["color15"])
-        )
-
-        return string
-
-
-class Bar:
-    def __init__(self, *,
-                 geometry: Optional[str] = "1920x30+0+0",
-                 bg_color: Optional[str] = "#000000",
-                 fg_color: Optional[str] = "#FFFFFF",
-                 offset: Optional[str] = "0",
-                 u_color: Optional[str] = "#000000",
-                 u_pixels: Optional[str] = "0",
-                 font_size: Optional[str] = "13",
-                 fonts: Optional[List[str]] = [],
-                 on_bottom: Optional[bool] = True,
-                 modules: Optional[Dict[str, Dict[str, str]]] = {
-                     "left": {}, "center": {}, "right": {}},
-                 dir: Optional[str] = os.path.join(
-                     os.path.expanduser("~"), "wallpapers"),
-                 img: Optional[str] = None,
-                 alpha: Optional[str] = "FF",
-                 ):
-
-        self.wallpaper = Wallpaper(dir=dir, img=img, alpha=alpha)
-        self.wallpaper.config_wallpaper()
-
-        self.options = {
-            "-g": geometry,
-            "-B": bg_color,
-            "-F": fg_color,
-            "-o": offset,
-            "-U": u_color,
-            "-u": u_pixels,
+    def snapshot_state(self):
+        return {
+            "config": self.config,
+            "settings": self.get_settings(),
+            "colors": self.wallpaper.get_colors() if self.wallpaper.has_palette() else None,
+            "modules": dict(self.modules.values),
         }
 
-        self.font_size = font_size
-        self.fonts = fonts
-
-        self.on_bottom = on_bottom
-
-        self.modules = modules
-
-        self.cmd = ["lemonbar"]
-        self.ps = None
-
+    @command(kind=MUTATOR, reload=True, key=str, val=str, doc="Set lemonbar's global option")
     def set_opt(self, key, val):
         if key in self.options.keys():
             self.options[key] = val
 
+    @command(key=str, doc="Get lemonbar's global option")
     def get_opt(self, key):
         return self.options.get(key)
 
+    @command(kind=MUTATOR, reload=True, val=str, doc="Add a font")
     def add_font(self, font):
         if font not in self.fonts:
             self.fonts.append(font)
 
+    @command(kind=MUTATOR, reload=True, val=str, doc="Remove a font")
     def remove_font(self, font):
         if font in self.fonts:
             self.fonts.remove(font)
 
+    @command(doc="Get all fonts")
     def get_fonts(self):
         return "\n".join(self.fonts)
 
+    @command(kind=MUTATOR, reload=True, doc="Clear all fonts")
     def clear_fonts(self):
         self.fonts.clear()
 
+    @command(kind=MUTATOR, reload=True, val=(str, int), doc="Set font size")
     def set_font_size(self, new_size):
         self.font_size = new_size
 
+    @command(doc="Get font size")
     def get_font_size(self):
         return self.font_size
 
-    def set_wallpaper(self, img_path):
+    @command(kind=MUTATOR, reload=True, val=str, doc="Set wallpaper")
+    async def set_wallpaper(self, img_path):
         self.wallpaper.set_img(img_path)
-        self.wallpaper.config_wallpaper()
+        await asyncio.gather(
+            self.wallpaper.config_wallpaper(),
+            self.wallpaper.load_palette(),
+        )
 
-    def set_random_wallpaper(self):
+    @command(kind=MUTATOR, reload=True, doc="Set random wallpaper")
+    async def set_random_wallpaper(self):
         self.wallpaper.set_random_img()
-        self.wallpaper.config_wallpaper()
+        await asyncio.gather(
+            self.wallpaper.config_wallpaper(),
+            self.wallpaper.load_palette(),
+        )
+
+    @command(kind=MUTATOR, reload=True, val=str, doc="Set alpha")
+    async def set_alpha(self, alpha):
+        self.wallpaper.set_alpha(alpha)
+        await self.wallpaper.load_palette()
 
+    @command(doc="Get wallpaper")
     def get_wallpaper(self):
         return self.wallpaper.get_img()
 
+    @command("get_colors", doc="Get theme colors")
     def get_theme_colors(self):
         return self.wallpaper.get_colors()
 
+    @command(doc="Get alpha")
+    def get_alpha(self):
+        return self.wallpaper.get_alpha()
+
+    @command(doc="Get palette cache hit/miss counters")
+    def get_palette_stats(self):
+        return self.wallpaper.palette_cache.get_stats()
+
+    @command(doc="Get coalesced/emitted frame counters")
+    def get_flush_stats(self):
+        return self.flusher.get_stats()
+
+    @command(kind=MUTATOR, flush=True, key=str, val=str, doc="Update a module's value")
     def update_mod(self, mod_id, mod_val):
-        if mod_id in self.modules.get("before_left", {}).keys():
-            self.modules["before_left"][mod_id] = mod_val
-        elif mod_id in self.modules.get("left", {}).keys():
-            self.modules["left"][mod_id] = mod_val
-        elif mod_id in self.modules.get("center", {}).keys():
-            self.modules["center"][mod_id] = mod_val
-        elif mod_id in self.modules.get("right", {}).keys():
-            self.modules["right"][mod_id] = mod_val
+        self.modules.update(mod_id, mod_val)
 
-    async def parse(self, obj):
-        cmd = obj.get("cmd")
-        key = obj.get("key")
-        val = obj.get("val")
+    @command(kind=MUTATOR, flush=True, key=str, val=dict,
+             doc='Add a module: val = {"section": ..., "value": ..., "pos": ...}')
+    def add_mod(self, mod_id, opts):
+        self.modules.add(
+            opts["section"], mod_id, opts.get("value", ""), opts.get("pos"))
 
-        # Assume no reply
-        rep = None
+    @command(kind=MUTATOR, flush=True, key=str, doc="Remove a module")
+    def remove_mod(self, mod_id):
+        self.modules.remove(mod_id)
 
-        api_mutators = {
+    @command(kind=MUTATOR, flush=True, key=str, val=dict,
+             doc='Move a module: val = {"section": ..., "pos": ...}')
+    def move_mod(self, mod_id, opts):
+        self.modules.move(mod_id, opts["section"], opts.get("pos"))
 
-            # Sets lemonbar's global option
-            "set_opt": lambda: self.set_opt(key, val),
+    @command(doc="Get the modules' layout and values")
+    def get_mods(self):
+        return self.modules.to_dict()
 
-            # Add a font
-            "add_font": lambda: self.add_font(val),
+    def register_command(self, name, handler, **meta):
+        """
+            Registers an extra API command (see commands.Command for `meta`)
 
-            # Remove a font
-            "remove_font": lambda: self.remove_font(val),
+            Raising KeyError/ValueError/TypeError replies with an error.
+        """
 
-            # Clear all fonts
-            "clear_fonts": self.clear_fonts,
+        self.commands.add(Command(name, handler, **meta))
 
-            # Set font size
-            "set_font_size": lambda: self.set_font_size(val),
+    @command(doc="List every command and its metadata")
+    def list_commands(self):
+        return self.commands.describe()
 
-            # Set wallpaper
-            "set_wallpaper": lambda: self.set_wallpaper(val),
+    async def parse(self, obj):
+        rep, reload = await self.execute(obj)
 
-            # Set random wallpaper
-            "set_random_wallpaper": self.set_random_wallpaper,
+        if reload:
+            self.request_reload()
 
-            # Set alpha
-            "set_alpha": lambda: self.wallpaper.set_alpha(val),
+        return rep
 
-        }
+    @command("batch", kind=MUTATOR, val=list,
+             doc="Run a list of commands, reloading at most once")
+    async def parse_batch(self, objs):
+        """
+            Runs a list of commands in order, reloading lemonbar at most once
 
-        api_accessors = {
+            Example:
+                {"cmd": "batch", "val": [
+                    {"cmd": "set_opt", "key": "-g", "val": "1920x30+0+0"},
+                    {"cmd": "add_font", "val": "Hack"},
+                    {"cmd": "get_fonts"},
+                ]}
+                -> {"replies": [{}, {}, "Hack"]}
+        """
 
-            # Get lemonbar's global option
-            "get_opt": lambda: self.get_opt(key),
+        replies = []
+        reload = False
 
-            # Get all fonts
-            "get_fonts": self.get_fonts,
+        for obj in objs:
+            rep, needs_reload = await self.execute(obj)
 
-            # Get font size
-            "get_font_size": self.get_font_size,
+            replies.append(rep)
+            reload = reload or needs_reload
 
-            # Get wallpaper
-            "get_wallpaper": self.get_wallpaper,
+        if reload:
+            self.request_reload()
 
-            # Get theme colors
-            "get_colors": self.get_theme_colors,
+        return {"replies": replies}
 
-            # Get alpha
-            "get_alpha": self.wallpaper.get_alpha,
+    async def execute(self, obj):
+        """ Runs a single command; returns (reply, whether lemonbar needs a reload) """
 
-        }
+        if not isinstance(obj, dict):
+            return {"error": "Invalid command"}, False
 
-        if cmd in api_mutators.keys():
-            api_mutators[cmd]()
-            await self.reload_bar()
-        elif cmd in api_accessors.keys():
-            rep = api_accessors[cmd]()
-            # In case it's a color
-            rep = self.wallpaper.replace_colors(rep)
-        elif cmd == "update_mod":
-            self.update_mod(key, val)
+        cmd = obj.get("cmd")
+        key = obj.get("key")
+        val = obj.get("val")
+
+        spec = self.commands.get(cmd)
+        if spec is None:
+            stats.incr("bar.unknown_commands")
+            return {"error": f"Unknown command: { cmd }"}, False
+
+        start = time.perf_counter()
+
+        try:
+            rep = await spec.invoke(key, val)
+        except (KeyError, ValueError, TypeError) as err:
+            stats.incr("bar.command_errors")
+            return {"error": err.args[0]}, False
+        finally:
+            stats.observe("bar.execute", time.perf_counter() - start)
+
+        if spec.flush:
             self.flush_mods()
-        else:
-            # Unknown cmd
-            rep = {"error": f"Unknown command: { cmd }"}
 
-        return rep or {}
+        # In case it's a color
+        if spec.kind == ACCESSOR and isinstance(rep, str):
+            rep = self.wallpaper.replace_colors(rep)
+
+        return rep or {}, spec.reload
 
     def build_cmd(self):
         options = []
@@ -599,119 +492,265 @@ class Bar:
         return [*self.cmd, *options, *fonts]
 
     def build_modules(self):
-        before_left = "".join(self.modules.get("before_left", {}).values())
-        left = "".join(self.modules.get("left", {}).values())
-        center = "".join(self.modules.get("center", {}).values())
-        right = "".join(self.modules.get("right", {}).values())
+        # A new palette invalidates every rendered fragment
+        palette = self.wallpaper.get_palette()
+        if palette is not self._palette:
+            self._palette = palette
+            self.modules.invalidate()
 
-        complete = f"{before_left}%{{l}}{left}%{{c}}{center}%{{r}}{right}"
-        complete = self.wallpaper.replace_colors(complete)
+        before_left, left, center, right = self.modules.render(
+            self.wallpaper.replace_colors)
 
-        return complete
+        return f"{before_left}%{{l}}{left}%{{c}}{center}%{{r}}{right}"
 
     def flush_mods(self):
-        if self.ps is not None:
-            mods = self.build_modules()
-            mods = mods.encode()
+        self.flusher.request()
+        self.state_writer.request()
 
-            self.ps.stdin.write(mods)
+    def request_reload(self):
+        """
+            Reloads lemonbar in the background
 
-    async def reload_bar(self):
-        tmp = self.ps
+            A reload still in progress is cancelled and restarted, so a burst
+            of mutators ends up starting a single lemonbar.
+        """
 
-        cmd = self.build_cmd()
+        # Mutators that leave lemonbar's arguments untouched
+        # (e.g. a wallpaper whose colors aren't used by any option)
+        # only need a redraw
+        self.state_writer.request()
 
-        self.ps = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.PIPE)
+        if self.build_cmd() == self.running_cmd:
+            self.flush_mods()
+            return
 
-        self.flush_mods()
+        if self.reload_task is not None and not self.reload_task.done():
+            self.reload_task.cancel()
+            self.reload_stats["cancelled"] += 1
+            stats.incr("reload.cancelled")
 
-        if tmp is not None:
-            # Needed for smoother transition
-            await asyncio.sleep(.5)
+        self.reload_task = asyncio.create_task(self.reload_bar())
+        self.reload_task.add_done_callback(self._reload_done)
 
-            tmp.stdin.close()
-            await tmp.wait()
+    def _reload_done(self, task):
+        if task.cancelled() or task.exception() is None:
+            return
 
-        # Needed so lemonbar goes behind full-screen programs
-        await self.fix_lemonbar()
+        self.reload_stats["failed"] += 1
+        stats.incr("reload.failed")
+        print(f"Couldn't reload lemonbar: { task.exception() }")
 
-    async def fix_lemonbar(self):
-        await asyncio.sleep(1)
-        _ps1 = await asyncio.create_subprocess_exec("xdo", "id", "-n", "root",
-                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        out1, err1 = await _ps1.communicate()
-        if _ps1.returncode != 0:
-            raise Exception(err1.decode())
+    async def reload_bar(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
 
-        _ps2 = await asyncio.create_subprocess_exec("xdo", "id", "-n", "lemonbar",
-                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        out2, err2 = await _ps2.communicate()
-        if _ps2.returncode != 0:
-            raise Exception("Error: ", err2.decode())
+        cmd = self.build_cmd()
 
-        out1 = out1.decode().strip()
-        out2 = out2.decode().strip()
+        # Not part of running_cmd, so unchanged arguments still skip the reload
+        self.spawned += 1
+        wm_name = f"lemonbar-manager-{ os.getpid() }-{ id(self) }-{ self.spawned }"
 
-        _ps3 = await asyncio.create_subprocess_exec("xdo", "above", "-t", out1, out2,
-                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        _, err3 = await _ps3.communicate()
-        if _ps3.returncode != 0:
-            raise Exception(err3.decode())
+        stage = time.perf_counter()
+        ps = await asyncio.create_subprocess_exec(
+            *cmd, "-n", wm_name,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
 
-    async def __aenter__(self):
-        await self.reload_bar()
-        return self
+        # Only a bar that started counts as running: after a failed spawn,
+        # the same arguments retry the reload
+        self.running_cmd = cmd
 
-    async def __aexit__(self, exc_type, exc_value, exc_traceback):
-        self.ps.stdin.close()
-        await self.ps.wait()
+        # The running bar (and any bar left by a cancelled reload)
+        # stays up until the new one is on screen
+        if self.ps is not None:
+            self.retiring.append(self.ps)
+        self.ps = ps
+
+        self.actions.attach(self.ps.stdout)
+        stage = self._reload_stage("reload.spawn", stage)
+
+        # Draw the new bar right away
+        self.flusher.attach(self.ps.stdin)
+        await self.flusher.flush()
+        startup.mark("first_frame")
+
+        # Needed so lemonbar goes behind full-screen programs; a failure
+        # here mustn't leave the old bar on screen
+        try:
+            win = await self.wait_for_window(wm_name)
+            stage = self._reload_stage("reload.wait_window", stage)
+            await self.fix_lemonbar(win)
+            stage = self._reload_stage("reload.stack", stage)
+            startup.mark("bar_mapped")
+        except Exception as err:
+            print(f"Couldn't restack lemonbar: { err }")
+
+        retiring, self.retiring = self.retiring, []
+        await asyncio.gather(*(self.close_bar(ps) for ps in retiring))
+        self._reload_stage("reload.close_old", stage)
+
+        latency = loop.time() - start
+        self.reload_stats["count"] += 1
+        self.reload_stats["last"] = latency
+        self.reload_stats["max"] = max(self.reload_stats["max"], latency)
+        self.reload_stats["total"] += latency
+        stats.observe("reload.total", latency)
+
+    def _reload_stage(self, name, start):
+        end = time.perf_counter()
+        stats.observe(name, end - start)
+        return end
+
+    async def close_bar(self, ps, timeout=2):
+        ps.stdin.close()
+
+        try:
+            await asyncio.wait_for(ps.wait(), timeout)
+        except asyncio.TimeoutError:
+            ps.kill()
+            await ps.wait()
+
+    async def xdo(self, *args, timeout=None):
+        ps = await asyncio.create_subprocess_exec("xdo", *args,
+                                                  stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+
+        try:
+            out, err = await asyncio.wait_for(ps.communicate(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Don't leave it waiting (e.g. `xdo id -m`) behind
+            ps.kill()
+            raise
+
+        if ps.returncode != 0:
+            raise Exception(err.decode())
+
+        # Several matches are possible, the newest window comes last
+        # (commands such as `above` print nothing)
+        out = out.decode().split()
+        return out[-1] if out else None
+
+    def connect_x11(self):
+        if self.x11 is None and self.use_xlib:
+            # Imported here, as it isn't needed for the first frame
+            import x11
+
+            self.x11 = x11.connect()
+            self.use_xlib = self.x11 is not None
+
+        return self.x11
+
+    async def wait_for_window(self, wm_name, timeout=5):
+        """ Waits for lemonbar's window (named `wm_name`) to be mapped, returns its id (None on timeout) """
+
+        if self.connect_x11() is not None:
+            return await self.x11.wait_for_window(wm_name, timeout)
+
+        try:
+            return await self.xdo("id", "-m", "-a", wm_name, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def fix_lemonbar(self, win):
+        if win is None:
+            print("lemonbar's window wasn't found, not restacking it")
+            return
+
+        if self.x11 is not None:
+            await self.x11.lower(win)
+            return
+
+        if self.root_win is None:
+            self.root_win = await self.xdo("id", "-n", "root")
+
+        await self.xdo("above", "-t", self.root_win, win)
+
+    @command(doc="Get reload latency")
+    def get_reload_stats(self):
+        count = self.reload_stats["count"] or 1
+
+        return {
+            **self.reload_stats,
+            "avg": self.reload_stats["total"] / count,
+        }
 
-    async def reload_bar(self):
-        tmp = self.ps
+    async def finish_startup(self):
+        """ Sets the wallpaper & loads its palette, then redraws with it """
 
-        cmd = self.build_cmd()
+        await asyncio.gather(
+            self.wallpaper.config_wallpaper(),
+            self.wallpaper.load_palette(),
+        )
+        startup.mark("wallpaper_and_palette")
 
-        self.ps = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.PIPE)
+        self.request_reload()
 
-        self.flush_mods()
+    async def wait_started(self):
+        """ Waits until startup (including the first reload) is over """
 
-        if tmp is not None:
-            # Needed for smoother transition
-            await asyncio.sleep(.5)
+        for task in (self.startup_task, self.reload_task):
+            if task is not None:
+                await asyncio.gather(task, return_exceptions=True)
 
-            tmp.stdin.close()
-            await tmp.wait()
+    @command(doc="Get every stage's latency histogram & counters")
+    def get_stats(self):
+        return stats.get_stats()
 
-        # Needed so lemonbar goes behind full-screen programs
-        await self.fix_lemonbar()
+    @command(doc="Get click actions' counters")
+    def get_action_stats(self):
+        return self.actions.get_stats()
 
-    async def fix_lemonbar(self):
-        await asyncio.sleep(1)
-        _ps1 = await asyncio.create_subprocess_exec("xdo", "id", "-n", "root",
-                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        out1, err1 = await _ps1.communicate()
-        if _ps1.returncode != 0:
-            raise Exception(err1.decode())
+    @command(doc="Get the state file's write stats")
+    def get_state_stats(self):
+        return self.state_writer.get_stats()
 
-        _ps2 = await asyncio.create_subprocess_exec("xdo", "id", "-n", "lemonbar",
-                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        out2, err2 = await _ps2.communicate()
-        if _ps2.returncode != 0:
-            raise Exception("Error: ", err2.decode())
+    @command(doc="Get the startup phases' timings (ms)")
+    def get_startup(self):
+        return startup.get_report()
 
-        out1 = out1.decode().strip()
-        out2 = out2.decode().strip()
+    async def __aenter__(self):
+        if not self.owns_wallpaper:
+            # Set up by the bar owning it
+            self.request_reload()
+            return self
+
+        if self.fast_start and self.wallpaper.has_palette():
+            # Draw right away with the cached palette, pywal runs in the background
+            self.request_reload()
+            self.startup_task = asyncio.create_task(self.finish_startup())
+        else:
+            await asyncio.gather(
+                self.wallpaper.config_wallpaper(),
+                self.wallpaper.load_palette(),
+            )
+            startup.mark("wallpaper_and_palette")
 
-        _ps3 = await asyncio.create_subprocess_exec("xdo", "above", "-t", out1, out2,
-                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-        _, err3 = await _ps3.communicate()
-        if _ps3.returncode != 0:
-            raise Exception(err3.decode())
+            await self.reload_bar()
+
+        # Precompute the other wallpapers' palettes in the background
+        self.index_task = asyncio.create_task(self.wallpaper.index.watch())
 
-    async def __aenter__(self):
-        await self.reload_bar()
         return self
 
     async def __aexit__(self, exc_type, exc_value, exc_traceback):
-        self.ps.stdin.close()
-        await self.ps.wait()
+        for task in (self.index_task, self.startup_task):
+            if task is not None:
+                task.cancel()
+        if self.owns_wallpaper:
+            self.wallpaper.index.save()
+
+        self.state_writer.write()
+
+        if self.reload_task is not None:
+            self.reload_task.cancel()
+
+        self.flusher.cancel()
+        await asyncio.gather(*(
+            self.close_bar(ps)
+            for ps in [*self.retiring, self.ps]
+            if ps is not None
+        ))
+
+        if self.owns_actions:
+            await self.actions.close()
+
+        if self.x11 is not None:
+            self.x11.close()
@@ -0,0 +1,269 @@
+"""
+    Client library & CLI for the manager's API
+
+    Library:
+        client = get_client()                    # pooled, long-lived connection
+        client.update_mod("date_time", "12:00")  # request/reply
+        client.push("date_time", "12:00")        # fire and forget
+
+        async_client = get_async_client()
+        await async_client.request("get_fonts")
+
+    CLI:
+        python client.py get_fonts
+        python client.py get_opt -- -B
+        python client.py update_mod date_time "12:00"
+        python client.py add_mod volume '{"section": "right"}' --json
+        python client.py --bar right set_opt -- -g 1920x30+1920+0
+
+        # One connection for a whole stream of "<module id> <value>" lines
+        some-script | python client.py --batch
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+from typing import Dict, Tuple
+
+import zmq
+import zmq.asyncio
+
+import protocol
+from connection import DEFAULT_ENDPOINT, DEFAULT_UPDATE_ENDPOINT
+
+
+def _update_frames(mod_id: str, mod_val: str, bar=None):
+    frames = [mod_id.encode(), mod_val.encode()]
+    if bar is not None:
+        frames.append(str(bar).encode())
+
+    return frames
+
+
+class Client:
+    """ Synchronous client keeping its sockets open between requests """
+
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, *,
+                 update_endpoint: str = DEFAULT_UPDATE_ENDPOINT,
+                 fmt: str = protocol.JSON,
+                 timeout: float = 5,
+                 ):
+        self.endpoint = endpoint
+        self.update_endpoint = update_endpoint
+        self.fmt = fmt
+        self.timeout = timeout
+
+        self.ctx = zmq.Context.instance()
+        self.sock = None
+        self.push_sock = None
+
+    def _connect(self):
+        self.sock = self.ctx.socket(zmq.REQ)
+        self.sock.setsockopt(zmq.LINGER, 0)
+        self.sock.setsockopt(zmq.RCVTIMEO, int(self.timeout * 1000))
+        self.sock.connect(self.endpoint)
+
+    def request(self, cmd: str, key=None, val=None, bar=None):
+        """ Sends a command (to a single bar if `bar`, else to all) and returns the reply """
+
+        if self.sock is None:
+            self._connect()
+
+        obj = {"cmd": cmd, "key": key, "val": val}
+        if bar is not None:
+            obj["bar"] = bar
+
+        try:
+            self.sock.send(protocol.encode_request(obj, self.fmt))
+            return protocol.decode_reply(self.sock.recv())
+        except zmq.Again:
+            # A REQ socket is stuck after a lost reply, start over
+            self.sock.close()
+            self.sock = None
+            raise TimeoutError(f"No reply from { self.endpoint }")
+
+    def update_mod(self, mod_id: str, mod_val: str, bar=None):
+        return self.request("update_mod", mod_id, mod_val, bar)
+
+    def batch(self, objs, bar=None):
+        return self.request("batch", val=objs, bar=bar)
+
+    def push(self, mod_id: str, mod_val: str, bar=None):
+        """ Sends a module update over the one-way channel, without waiting """
+
+        if self.push_sock is None:
+            self.push_sock = self.ctx.socket(zmq.PUSH)
+            self.push_sock.connect(self.update_endpoint)
+
+        self.push_sock.send_multipart(_update_frames(mod_id, mod_val, bar))
+
+    def close(self, linger: float = 1):
+        for sock in (self.sock, self.push_sock):
+            if sock is not None:
+                sock.close(int(linger * 1000))
+
+        self.sock = self.push_sock = None
+
+
+class AsyncClient:
+    """ asyncio client keeping its sockets open between requests """
+
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, *,
+                 update_endpoint: str = DEFAULT_UPDATE_ENDPOINT,
+                 fmt: str = protocol.JSON,
+                 timeout: float = 5,
+                 ):
+        self.endpoint = endpoint
+        self.update_endpoint = update_endpoint
+        self.fmt = fmt
+        self.timeout = timeout
+
+        self.ctx = zmq.asyncio.Context.instance()
+        self.sock = None
+        self.push_sock = None
+
+        # A REQ socket handles a single request at a time
+        self.lock = asyncio.Lock()
+
+    async def request(self, cmd: str, key=None, val=None, bar=None):
+        obj = {"cmd": cmd, "key": key, "val": val}
+        if bar is not None:
+            obj["bar"] = bar
+
+        async with self.lock:
+            if self.sock is None:
+                self.sock = self.ctx.socket(zmq.REQ)
+                self.sock.setsockopt(zmq.LINGER, 0)
+                self.sock.connect(self.endpoint)
+
+            try:
+                await self.sock.send(protocol.encode_request(obj, self.fmt))
+                payload = await asyncio.wait_for(self.sock.recv(), self.timeout)
+            except asyncio.TimeoutError:
+                self.sock.close()
+                self.sock = None
+                raise TimeoutError(f"No reply from { self.endpoint }")
+
+        return protocol.decode_reply(payload)
+
+    async def update_mod(self, mod_id: str, mod_val: str, bar=None):
+        return await self.request("update_mod", mod_id, mod_val, bar)
+
+    async def batch(self, objs, bar=None):
+        return await self.request("batch", val=objs, bar=bar)
+
+    async def push(self, mod_id: str, mod_val: str, bar=None):
+        if self.push_sock is None:
+            self.push_sock = self.ctx.socket(zmq.PUSH)
+            self.push_sock.connect(self.update_endpoint)
+
+        await self.push_sock.send_multipart(_update_frames(mod_id, mod_val, bar))
+
+    def close(self, linger: float = 1):
+        for sock in (self.sock, self.push_sock):
+            if sock is not None:
+                sock.close(int(linger * 1000))
+
+        self.sock = self.push_sock = None
+
+
+# Connection pools: (endpoint, update endpoint, format) -> client
+_clients: Dict[Tuple[str, str, str], Client] = {}
+_async_clients: Dict[Tuple[str, str, str], AsyncClient] = {}
+
+
+def get_client(endpoint: str = DEFAULT_ENDPOINT,
+               update_endpoint: str = DEFAULT_UPDATE_ENDPOINT,
+               fmt: str = protocol.JSON) -> Client:
+    key = (endpoint, update_endpoint, fmt)
+
+    if key not in _clients:
+        _clients[key] = Client(endpoint, update_endpoint=update_endpoint, fmt=fmt)
+
+    return _clients[key]
+
+
+def get_async_client(endpoint: str = DEFAULT_ENDPOINT,
+                     update_endpoint: str = DEFAULT_UPDATE_ENDPOINT,
+                     fmt: str = protocol.JSON) -> AsyncClient:
+    key = (endpoint, update_endpoint, fmt)
+
+    if key not in _async_clients:
+        _async_clients[key] = AsyncClient(endpoint, update_endpoint=update_endpoint, fmt=fmt)
+
+    return _async_clients[key]
+
+
+def run_batch(client: Client, lines, reliable: bool = False, bar=None) -> int:
+    """
+        Sends one update per "<module id> <value>" line over a single connection
+
+        Updates are pushed one-way, unless `reliable` (then each is
+        acknowledged). Returns the number of rejected updates.
+    """
+
+    errors = 0
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line:
+            continue
+
+        mod_id, _, mod_val = line.partition(" ")
+
+        if reliable:
+            rep = client.update_mod(mod_id, mod_val, bar)
+            if isinstance(rep, dict) and "error" in rep:
+                print(rep["error"], file=sys.stderr)
+                errors += 1
+        else:
+            client.push(mod_id, mod_val, bar)
+
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talk to a running lemonbar manager")
+    parser.add_argument("cmd", nargs="?", help="command name (see list_commands)")
+    parser.add_argument("key", nargs="?")
+    parser.add_argument("val", nargs="?")
+    parser.add_argument("--json", action="store_true", help="parse val as JSON")
+    parser.add_argument("--batch", action="store_true",
+                        help='read "<module id> <value>" lines from stdin')
+    parser.add_argument("--reliable", action="store_true",
+                        help="with --batch, wait for each update to be acknowledged")
+    parser.add_argument("--binary", action="store_true", help="use the binary protocol")
+    parser.add_argument("--bar", help="address a single bar (see get_bars), default: all")
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT)
+    parser.add_argument("--update-endpoint", default=DEFAULT_UPDATE_ENDPOINT)
+    args = parser.parse_args()
+
+    client = get_client(
+        args.endpoint, args.update_endpoint,
+        protocol.BINARY if args.binary else protocol.JSON,
+    )
+
+    try:
+        if args.batch:
+            sys.exit(1 if run_batch(client, sys.stdin, args.reliable, args.bar) else 0)
+
+        if args.cmd is None:
+            parser.error("a command is required (or --batch)")
+
+        val = json.loads(args.val) if args.json and args.val is not None else args.val
+        rep = client.request(args.cmd, args.key, val, args.bar)
+    finally:
+        client.close()
+
+    if isinstance(rep, str):
+        print(rep)
+    elif rep != {}:
+        print(json.dumps(rep, indent=2))
+
+    if isinstance(rep, dict) and "error" in rep:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import inspect
+from typing import Callable, Dict, Optional, Tuple, Type, Union
+
+MUTATOR = "mutator"
+ACCESSOR = "accessor"
+
+ArgType = Optional[Union[Type, Tuple[Type, ...]]]
+
+
+class Command:
+    """
+        An API command and its metadata
+
+        `key`/`val` are the expected types of the request's key/val
+        (None: unused). The handler receives only the arguments it declares:
+            handler(key, val), handler(key), handler(val) or handler()
+    """
+
+    __slots__ = ("name", "kind", "reload", "flush", "key", "val", "doc", "handler")
+
+    def __init__(self, name: str, handler: Optional[Callable] = None, *,
+                 kind: str = ACCESSOR,
+                 reload: bool = False,
+                 flush: bool = False,
+                 key: ArgType = None,
+                 val: ArgType = None,
+                 doc: str = "",
+                 ):
+        self.name = name
+        self.kind = kind
+        self.reload = reload
+        self.flush = flush
+        self.key = key
+        self.val = val
+        self.doc = doc
+        self.handler = handler
+
+    def bind(self, handler: Callable) -> "Command":
+        return Command(
+            self.name, handler,
+            kind=self.kind, reload=self.reload, flush=self.flush,
+            key=self.key, val=self.val, doc=self.doc,
+        )
+
+    def validate(self, key, val):
+        if self.key is not None and not isinstance(key, self.key):
+            raise TypeError(f"{ self.name }: key must be { _type_name(self.key) }")
+
+        if self.val is not None and not isinstance(val, self.val):
+            raise TypeError(f"{ self.name }: val must be { _type_name(self.val) }")
+
+    def call(self, key, val):
+        if self.key is not None:
+            if self.val is not None:
+                return self.handler(key, val)
+            return self.handler(key)
+
+        if self.val is not None:
+            return self.handler(val)
+
+        return self.handler()
+
+    async def invoke(self, key, val):
+        """ Validates the arguments and runs the handler (awaited if needed) """
+
+        self.validate(key, val)
+
+        rep = self.call(key, val)
+        if inspect.isawaitable(rep):
+            rep = await rep
+
+        return rep
+
+    def describe(self):
+        return {
+            "kind": self.kind,
+            "reload": self.reload,
+            "key": _type_name(self.key),
+            "val": _type_name(self.val),
+            "doc": self.doc,
+        }
+
+
+def _type_name(arg_type: ArgType) -> Optional[str]:
+    if arg_type is None:
+        return None
+
+    if isinstance(arg_type, tuple):
+        return " | ".join(t.__name__ for t in arg_type)
+
+    return arg_type.__name__
+
+
+def command(name: Optional[str] = None, **meta):
+    """
+        Declares a method as an API command
+
+        Example:
+            @command(kind=MUTATOR, reload=True, val=str, doc="Add a font")
+            def add_font(self, font): ...
+    """
+
+    def _decorator(fn):
+        fn.command = Command(name or fn.__name__, **meta)
+        return fn
+
+    return _decorator
+
+
+class CommandRegistry:
+    """ Commands by name, built once per object from its @command methods """
+
+    def __init__(self, obj=None):
+        self.commands: Dict[str, Command] = {}
+
+        if obj is not None:
+            for _, method in inspect.getmembers(obj, inspect.ismethod):
+                spec = getattr(method, "command", None)
+                if spec is not None:
+                    self.add(spec.bind(method))
+
+    def __contains__(self, name):
+        return name in self.commands
+
+    def get(self, name) -> Optional[Command]:
+        return self.commands.get(name)
+
+    def add(self, spec: Command):
+        self.commands[spec.name] = spec
+
+    def describe(self):
+        return {
+            name: spec.describe()
+            for name, spec in sorted(self.commands.items())
+        }
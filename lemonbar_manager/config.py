@@ -1,3 +1,6 @@
+from providers import battery, date_time
+
+
 _modules = {
     "left": {
         "desktops": "%{O10}...%{O10}",
@@ -11,6 +14,16 @@ _modules = {
     },
 }
 
+# Where the API listens (default: a Unix socket in $XDG_RUNTIME_DIR, per display).
+# TCP here, as the subscriptions below run the external lemonc, which talks TCP:
+endpoint = "tcp://127.0.0.1:5555"
+# Fire-and-forget module updates (PUSH [module id, value] frames) go to `update_endpoint`.
+
+# Latency histograms & counters (see the get_stats command) can also be dumped
+# to a file every `stats_interval` seconds (60 by default):
+#     stats_path = "/tmp/lemonbar-manager-stats.json"
+
+
 bar_config = {
     "geometry": "1920x36+0+0",
     "fg_color": "${foreground}",
@@ -25,13 +38,30 @@ bar_config = {
     "alpha": "D0",
 }
 
+# Several outputs: a list of bars, served by one manager (addressed by "name"):
+#     bar_config = [
+#         {**bar_config, "name": "left"},
+#         {**bar_config, "name": "right", "geometry": "1920x36+1920+0"},
+#     ]
 
-to_update = [
-    (1, ["lemonc", "date-time"]),
-    (5, ["lemonc", "battery"]),
+
+# In-process providers: (delay in seconds, module id, provider)
+to_provide = [
+    (1, "date_time", date_time("%a %d %b %H:%M:%S", prefix="%{O10}", suffix="%{O10}")),
+    (5, "battery", battery("BAT0", prefix="%{O10}", suffix="%{O10}")),
 ]
 
 
+# External commands, run every Nth second: (delay in seconds, command)
+to_update = []
+
+
+# Click actions: a module printing %{A:volume up:}...%{A} runs to_click["volume"]("up").
+# An action may also be an API request (%{A:{"cmd"\: "set_random_wallpaper"}:}),
+# other actions run in a shell only with shell_actions = True.
+to_click = {}
+
+
 to_subscribe = [
     (["bspc", "subscribe", "desktop_focus"], ["lemonc", "bspwm-desktops"]),
     (["bspc", "subscribe", "node_focus"], ["lemonc", "bspwm-desktops"]),
@@ -1,17 +1,76 @@
+import os
 from contextlib import contextmanager
 
-import zmq
-import zmq.asyncio
+from files import display_id
+
+
+def default_endpoint(suffix=""):
+    """
+        Local Unix socket, one per X display:
+            ipc://$XDG_RUNTIME_DIR/lemonbar-manager-<display><suffix>.sock
+    """
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", "/tmp")
+
+    return f"ipc://{ os.path.join(runtime_dir, f'lemonbar-manager-{ display_id() }{ suffix }.sock') }"
+
+
+DEFAULT_ENDPOINT = (
+    os.environ.get("LEMONBAR_MANAGER_ENDPOINT") or
+    default_endpoint()
+)
+
+DEFAULT_UPDATE_ENDPOINT = (
+    os.environ.get("LEMONBAR_MANAGER_UPDATE_ENDPOINT") or
+    default_endpoint("-updates")
+)
+
+
+@contextmanager
+def get_async_server_sock(endpoint: str = DEFAULT_ENDPOINT):
+    """
+        Yields socket (via context manager) for a server using ZeroMQ
+
+        The socket is a ROUTER, so several clients (REQ or DEALER)
+        can have requests in flight at once.
+
+        Any ZeroMQ endpoint works, e.g.:
+            ipc:///run/user/1000/bar.sock  (Unix socket, the default)
+            ipc://@lemonbar                (abstract Unix socket)
+            tcp://127.0.0.1:5555
+    """
+
+    # Imported lazily, so it stays off the path to the first frame
+    import zmq.asyncio
+
+    try:
+        ctx = zmq.asyncio.Context()
+        sock = ctx.socket(zmq.ROUTER)
+        sock.bind(endpoint)
+
+        yield sock
+    except Exception as err:
+        print(f"Unexcepted ZMQ error: { err }")
+    finally:
+        ctx.destroy()
 
 
 @contextmanager
-def get_async_server_sock():
-    """ Yields socket (via context manager) for a server using ZeroMQ """
+def get_async_pull_sock(endpoint: str = DEFAULT_UPDATE_ENDPOINT):
+    """
+        Yields socket (via context manager) for the one-way module update channel
+
+        Producers PUSH two frames per update, without waiting for a reply:
+            [module id, value]  (both UTF-8)
+    """
+
+    # Imported lazily (see get_async_server_sock)
+    import zmq.asyncio
 
     try:
         ctx = zmq.asyncio.Context()
-        sock = ctx.socket(zmq.REP)
-        sock.bind("tcp://*:5555")
+        sock = ctx.socket(zmq.PULL)
+        sock.bind(endpoint)
 
         yield sock
     except Exception as err:
@@ -0,0 +1,27 @@
+import os
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "lemonbar-manager",
+)
+
+
+def display_id() -> str:
+    """ The X display ($DISPLAY), usable in a file name: ":1" -> "1" """
+
+    return os.environ.get("DISPLAY", ":0").replace(":", "").replace("/", "_")
+
+
+def cache_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, name)
+
+
+def write_atomic(path: str, data: str):
+    """ Writes a file through a temporary one, so readers never see it half written """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    tmp = f"{ path }.tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+    os.replace(tmp, path)
@@ -0,0 +1,116 @@
+import time
+import asyncio
+from typing import Callable
+
+import stats
+
+
+class FlushScheduler:
+    """
+        Coalesces flush requests into frames written to lemonbar's stdin
+
+        Requests arriving within `window` seconds of each other are merged
+        into a single frame, and frames are never emitted more often than
+        `max_fps` per second. A frame is only written when the rendered
+        line differs from the last one sent, and the write awaits `drain()`
+        so a slow lemonbar applies backpressure instead of buffering.
+    """
+
+    def __init__(self, render: Callable[[], str], *,
+                 window: float = 0.01,
+                 max_fps: float = 30,
+                 ):
+        self.render = render
+        self.window = window
+        self.interval = 1 / max_fps if max_fps else 0
+
+        self.stdin = None
+        self.last_line = None
+        self.last_emit = 0.0
+        self.task = None
+        # When the pending frame was first requested
+        self.requested_at = None
+
+        # Counters
+        self.requested = 0
+        self.coalesced = 0
+        self.emitted = 0
+        self.unchanged = 0
+
+    def attach(self, stdin):
+        """ Points the scheduler at a (new) lemonbar process """
+
+        self.stdin = stdin
+        self.last_line = None
+
+    def request(self):
+        """ Schedules a frame; a no-op if one is already pending """
+
+        self.requested += 1
+
+        if self.task is not None:
+            self.coalesced += 1
+            return
+
+        self.requested_at = time.perf_counter()
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        delay = max(self.window, self.last_emit + self.interval - loop.time())
+
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.task = None
+
+        await self.flush()
+
+    async def flush(self):
+        """ Renders and writes a frame right away """
+
+        if self.stdin is None:
+            return
+
+        start = time.perf_counter()
+        line = self.render()
+        stats.observe("flush.render", time.perf_counter() - start)
+
+        if line == self.last_line:
+            self.unchanged += 1
+            return
+
+        self.last_line = line
+        self.last_emit = asyncio.get_running_loop().time()
+        self.emitted += 1
+
+        start = time.perf_counter()
+
+        try:
+            self.stdin.write(f"{ line }\n".encode())
+            await self.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # lemonbar went away (e.g. mid reload)
+            self.stdin = None
+            return
+
+        end = time.perf_counter()
+        stats.observe("flush.write", end - start)
+
+        # From the first update of the frame to lemonbar's stdin
+        if self.requested_at is not None:
+            stats.observe("flush.latency", end - self.requested_at)
+            self.requested_at = None
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def get_stats(self):
+        return {
+            "requested": self.requested,
+            "coalesced": self.coalesced,
+            "emitted": self.emitted,
+            "unchanged": self.unchanged,
+        }
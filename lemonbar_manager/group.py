@@ -0,0 +1,224 @@
+import os
+import time
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Dict, List, Optional, Set, Tuple
+
+import stats
+from bar import Bar
+from actions import ActionDispatcher
+from state import DEFAULT_STATE_PATH
+from commands import MUTATOR, Command, CommandRegistry, command
+
+# Commands acting on the shared wallpaper: run once, then every bar redraws
+SHARED_COMMANDS = ("set_wallpaper", "set_random_wallpaper", "set_alpha")
+
+
+class BarGroup:
+    """
+        Several bars (e.g. one per output) behind a single API
+
+        Bars are configured like a single one, plus an optional "name" (the
+        bar's index by default). The first bar owns the wallpaper, the other
+        bars share it and its palette cache, and every bar's clicks go to
+        `actions` (its API being the group's). Providers, timers and
+        subscriptions feed the group: a module value is computed once and
+        rendered into every bar showing that module.
+
+        A request with a "bar" field goes to that bar only, except for the
+        wallpaper & alpha (SHARED_COMMANDS), which always apply to every
+        bar. Otherwise, mutators are broadcast to every bar (and succeed if
+        any bar accepts them), accessors are answered by the first bar.
+    """
+
+    def __init__(self, configs: List[Dict], actions: Optional[ActionDispatcher] = None):
+        self.actions = actions if actions is not None else ActionDispatcher()
+        if self.actions.api is None:
+            self.actions.api = self.parse
+
+        self.bars: Dict[str, Bar] = {}
+
+        wallpaper = None
+
+        for i, config in enumerate(configs):
+            config = dict(config)
+            name = str(config.pop("name", i))
+
+            if name in self.bars:
+                raise ValueError(f"Duplicate bar name: { name }")
+
+            # One state file per bar
+            if len(configs) > 1 and "state_path" not in config:
+                root, ext = os.path.splitext(DEFAULT_STATE_PATH)
+                config["state_path"] = f"{ root }-{ name }{ ext }"
+
+            bar = self.bars[name] = Bar(**config, wallpaper=wallpaper, actions=self.actions)
+            wallpaper = bar.wallpaper
+
+        self.primary = next(iter(self.bars.values()))
+
+        # Bars showing a module updated since the last flush
+        self.pending: Set[Bar] = set()
+
+        self.startup_task = None
+        self.exit_stack = None
+
+        self.commands = CommandRegistry(self)
+
+    def get_bar(self, name) -> Bar:
+        if name not in self.bars:
+            raise KeyError(f"Unknown bar: { name }")
+
+        return self.bars[name]
+
+    @command(kind=MUTATOR, flush=True, key=str, val=str,
+             doc="Update a module, in every bar showing it")
+    def update_mod(self, mod_id, mod_val):
+        found = False
+
+        for bar in self.bars.values():
+            if mod_id in bar.modules:
+                bar.update_mod(mod_id, mod_val)
+                self.pending.add(bar)
+                found = True
+
+        if not found:
+            raise KeyError(f"Unknown module: { mod_id }")
+
+    def flush_mods(self):
+        pending, self.pending = self.pending, set()
+
+        for bar in pending:
+            bar.flush_mods()
+
+    @command(doc="Get the bars' names and geometries")
+    def get_bars(self):
+        return {name: bar.options["-g"] for name, bar in self.bars.items()}
+
+    def register_command(self, name, handler, **meta):
+        """ Registers an extra API command, served for the whole group """
+
+        self.commands.add(Command(name, handler, **meta))
+
+    @command(doc="List every command and its metadata")
+    def list_commands(self):
+        return {**self.primary.commands.describe(), **self.commands.describe()}
+
+    async def parse(self, obj):
+        rep, to_reload = await self.execute(obj)
+
+        for bar in to_reload:
+            bar.request_reload()
+
+        return rep
+
+    @command("batch", kind=MUTATOR, val=list,
+             doc="Run a list of commands, reloading each bar at most once")
+    async def parse_batch(self, objs):
+        replies = []
+        to_reload = set()
+
+        for obj in objs:
+            rep, needs_reload = await self.execute(obj)
+
+            replies.append(rep)
+            to_reload |= needs_reload
+
+        for bar in to_reload:
+            bar.request_reload()
+
+        return {"replies": replies}
+
+    async def execute(self, obj) -> Tuple[Dict, Set[Bar]]:
+        """ Runs a single command; returns (reply, the bars needing a reload) """
+
+        if not isinstance(obj, dict):
+            return {"error": "Invalid command"}, set()
+
+        cmd = obj.get("cmd")
+
+        # Shared by every bar, whichever bar the request names
+        if cmd in SHARED_COMMANDS:
+            rep, reload = await self.primary.execute(obj)
+            return rep, set(self.bars.values()) if reload else set()
+
+        if obj.get("bar") is not None:
+            try:
+                bar = self.get_bar(str(obj["bar"]))
+            except KeyError as err:
+                return {"error": err.args[0]}, set()
+
+            rep, reload = await bar.execute(obj)
+            return rep, {bar} if reload else set()
+
+        spec = self.commands.get(cmd)
+        if spec is not None:
+            start = time.perf_counter()
+
+            try:
+                rep = await spec.invoke(obj.get("key"), obj.get("val"))
+            except (KeyError, ValueError, TypeError) as err:
+                stats.incr("bar.command_errors")
+                return {"error": err.args[0]}, set()
+            finally:
+                stats.observe("bar.execute", time.perf_counter() - start)
+
+            if spec.flush:
+                self.flush_mods()
+
+            return rep or {}, set()
+
+        spec = self.primary.commands.get(cmd)
+
+        if spec is None or spec.kind != MUTATOR:
+            rep, reload = await self.primary.execute(obj)
+            return rep, {self.primary} if reload else set()
+
+        replies = []
+        to_reload = set()
+
+        for bar in self.bars.values():
+            rep, reload = await bar.execute(obj)
+
+            replies.append(rep)
+            if reload:
+                to_reload.add(bar)
+
+        ok = [rep for rep in replies if not (isinstance(rep, dict) and "error" in rep)]
+        return (ok or replies)[0], to_reload
+
+    async def finish_startup(self):
+        """ Redraws the other bars once the wallpaper's palette is loaded """
+
+        await asyncio.gather(self.primary.startup_task, return_exceptions=True)
+
+        for bar in self.bars.values():
+            if bar is not self.primary:
+                bar.request_reload()
+
+    async def wait_started(self):
+        if self.startup_task is not None:
+            await asyncio.gather(self.startup_task, return_exceptions=True)
+
+        for bar in self.bars.values():
+            await bar.wait_started()
+
+    async def __aenter__(self):
+        async with AsyncExitStack() as stack:
+            # The wallpaper's owner first
+            for bar in self.bars.values():
+                await stack.enter_async_context(bar)
+
+            self.exit_stack = stack.pop_all()
+
+        if self.primary.startup_task is not None:
+            self.startup_task = asyncio.create_task(self.finish_startup())
+
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_traceback):
+        if self.startup_task is not None:
+            self.startup_task.cancel()
+
+        await self.exit_stack.__aexit__(exc_type, exc_value, exc_traceback)
+        await self.actions.close()
@@ -1,84 +1,175 @@
+import startup  # noqa: F401 (first, so it times everything else)
+import stats
+
+import os
 import asyncio
-from typing import List, Tuple, Dict
+import inspect
+import functools
+from typing import List, Tuple
 
-from connection import get_async_server_sock
-from bar import Bar
+from connection import (
+    DEFAULT_ENDPOINT, DEFAULT_UPDATE_ENDPOINT,
+    get_async_pull_sock, get_async_server_sock,
+)
+from group import BarGroup
+from actions import ActionDispatcher
+from commands import MUTATOR
+from server import Server
+from providers import Provider, run_command, run_provider, update_once
+from subscriptions import SubscriptionEngine, Target
+from timers import TimerScheduler
 try:
     from config import bar_config
-except ModuleNotFoundError:
+except ImportError:
     bar_config = {}
 try:
     from config import to_update
-except ModuleNotFoundError:
+except ImportError:
     to_update = []
 try:
     from config import to_subscribe
-except ModuleNotFoundError:
+except ImportError:
     to_subscribe = []
+try:
+    from config import to_provide
+except ImportError:
+    to_provide = []
+try:
+    from config import to_click
+except ImportError:
+    to_click = {}
+try:
+    from config import shell_actions
+except ImportError:
+    shell_actions = False
+try:
+    from config import stats_path
+except ImportError:
+    stats_path = None
+try:
+    from config import stats_interval
+except ImportError:
+    stats_interval = 60
+try:
+    from config import endpoint
+except ImportError:
+    endpoint = DEFAULT_ENDPOINT
+try:
+    from config import update_endpoint
+except ImportError:
+    update_endpoint = DEFAULT_UPDATE_ENDPOINT
+
+
+startup.mark("imports")
 
 
 async def main_loop(
-    config: Dict
+    bars: BarGroup,
+    endpoint: str = DEFAULT_ENDPOINT,
+) -> None:
+
+    with get_async_server_sock(endpoint) as sock:
+        server = Server(sock, bars.parse)
+        bars.register_command(
+            "get_ipc_stats", server.get_stats,
+            doc="Get request queue-depth & concurrency metrics")
+
+        await server.run()
+
+
+async def update_loop(
+    bars: BarGroup,
+    endpoint: str = DEFAULT_UPDATE_ENDPOINT,
 ) -> None:
 
-    async with Bar(**config) as bar:
-        with get_async_server_sock() as sock:
-            while True:
-                obj = await sock.recv_json()
-                rep = await bar.parse(obj)
-                sock.send_json(rep)
+    """
+        Receives fire-and-forget module updates:
+        [module id, value] frames, or [module id, value, bar name] for a single bar
+
+        Nothing is replied, so producers never wait on the bar;
+        malformed updates, and updates for unknown modules (or bars), are counted and dropped.
+    """
+
+    update_stats = {"received": 0, "dropped": 0}
+    bars.register_command(
+        "get_update_stats", lambda: update_stats,
+        doc="Get the one-way update channel's counters")
+
+    with get_async_pull_sock(endpoint) as sock:
+        while True:
+            frames = await sock.recv_multipart()
+            update_stats["received"] += 1
+
+            if len(frames) not in (2, 3):
+                update_stats["dropped"] += 1
+                continue
+
+            try:
+                mod_id, mod_val = frames[0].decode(), frames[1].decode()
+                target = bars.get_bar(frames[2].decode()) if len(frames) == 3 else bars
+                target.update_mod(mod_id, mod_val)
+            except (KeyError, UnicodeDecodeError):
+                update_stats["dropped"] += 1
+                continue
+
+            target.flush_mods()
 
 
 async def exec_after(
+    bars: BarGroup,
     to_update: List[Tuple[int, List[str]]],
-    to_subscribe: List[Tuple[str, List[str]]],
+    to_subscribe: List[Tuple[List[str], Target]],
+    to_provide: List[Tuple[int, str, Provider]],
 ) -> None:
 
     """
-        Create and execute processes that can either 
+        Create and execute processes that can either
         run in background (triggered by events) or be executed every Nth second.
 
         Parameters:
+            bars: the bars in-process providers push their values to
             to_update: a list containing all the jobs to schedule for updates
-            to_subscribe: a list containing all the jobs to schedule for background execs
+            to_subscribe: a list containing all the event subscriptions
+            to_provide: a list containing all the in-process module providers
 
         A job is a tuple which contains:
             - the delay in seconds
             - a list of the command and args to execute
-    """
-
-    async def _update(delay, cmd):
-        """ 
-            Creates and Executes a process every Nth second 
 
-            Example:
-                To execute the command echo "Hello world" every 2 seconds:
-                    await _update(2, ["echo", "Hello world"])
-        """
+        A subscription is a tuple which contains:
+            - the event source command (its stdout lines are the events)
+            - the callback: a command, or a callable receiving the event line
+            - optionally, the callback's debounce in seconds
 
-        while True:
-            await asyncio.create_subprocess_exec(*cmd)
-            await asyncio.sleep(delay)
+        A provider is a tuple which contains:
+            - the delay in seconds (ignored for async generators)
+            - the module id to update
+            - the provider (see providers.run_provider)
+    """
 
-    async def _subscribe(ev, cb):
-        """ 
-            Creates and Executes a process in the background triggered on an event call
+    # Every periodic job (commands & polled providers) runs from one scheduler
+    timers = TimerScheduler()
 
-            Example:
-                To execute the command echo "Hello world":
-                    job = (2, ["echo", "Hello world"])
-                    await _subscribe([job])
-        """
+    def _add_timer(name, opts):
+        """ val = {"interval": ..., "cmd": [...], "align": ...} """
 
-        event = await asyncio.create_subprocess_exec(
-            *ev,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        timers.add(
+            name, float(opts["interval"]),
+            functools.partial(run_command, opts["cmd"]), opts.get("align", True))
 
-        while True:
-            await asyncio.create_subprocess_exec(*cb)
-            await event.stdout.readline()
+    bars.register_command(
+        "add_timer", _add_timer, kind=MUTATOR, key=str, val=dict,
+        doc='Run a command periodically: val = {"interval": ..., "cmd": [...], "align": ...}')
+    bars.register_command(
+        "remove_timer", timers.remove, kind=MUTATOR, key=str,
+        doc="Remove a periodic job")
+    bars.register_command(
+        "set_timer", lambda key, val: timers.retune(key, float(val)),
+        kind=MUTATOR, key=str, val=(int, float, str),
+        doc="Change a periodic job's interval")
+    bars.register_command(
+        "get_timers", timers.get_stats,
+        doc="Get every periodic job's lateness & runtime stats")
 
     # To excute tasks in parallel:
     #     1. Store all tasks in an array/tuple/set/etc.
@@ -86,30 +177,93 @@ async def exec_after(
     # NOTE: If you try to await the tasks directly (before storing them in a list),
     #           the first task will block
 
-    tasks = []
+    tasks = [
+        asyncio.create_task(timers.run())
+    ]
+
+    for delay, mod_id, provider in to_provide:
+        if inspect.isasyncgenfunction(provider):
+            tasks.append(
+                asyncio.create_task(run_provider(bars, mod_id, provider))
+            )
+        else:
+            timers.add(
+                mod_id, delay,
+                functools.partial(update_once, bars, mod_id, provider))
 
-    for delay, cmd in jobs:
-        tasks.append(
-            asyncio.create_task(_update(delay, cmd))
-        )
+    for delay, cmd in to_update:
+        timers.add(" ".join(cmd), delay, functools.partial(run_command, cmd))
 
-    for ev, cb in jobs:
-        tasks.append(
-            asyncio.create_task(_subscribe(ev, cb))
-        )
+    # Identical sources share one child process, identical callbacks one handler
+    subscriptions = SubscriptionEngine()
+
+    for ev, cb, *debounce in to_subscribe:
+        subscriptions.subscribe(ev, cb, *debounce)
+
+    bars.register_command(
+        "get_subscriptions", subscriptions.get_stats,
+        doc="Get event sources' & handlers' counters")
+
+    tasks.append(
+        asyncio.create_task(subscriptions.run())
+    )
 
     for task in tasks:
         await task
 
 
+# Tasks running alongside the main loops (referenced, so they can't be collected mid-run)
+background_tasks = set()
+
+
+def run_in_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+def _background_done(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Background task failed: { task.exception() }")
+
+
+async def report_startup(bars: BarGroup) -> None:
+    await bars.wait_started()
+    startup.print_report()
+
+
 async def main():
-    await asyncio.gather(
-        main_loop(bar_config),
-        exec_after(
-            to_update,
-            to_subscribe,
-        )
-    )
+    # A single bar, or a list of bars (e.g. one per output)
+    configs = bar_config if isinstance(bar_config, list) else [bar_config]
+
+    actions = ActionDispatcher(shell=shell_actions)
+    for name, action in to_click.items():
+        actions.register(name, action)
+
+    async with BarGroup(configs, actions) as bars:
+        if os.environ.get("LEMONBAR_MANAGER_STARTUP_REPORT"):
+            run_in_background(report_startup(bars))
+
+        if stats_path is not None:
+            run_in_background(stats.dump_every(stats_path, stats_interval))
+
+        try:
+            await asyncio.gather(
+                main_loop(bars, endpoint),
+                update_loop(bars, update_endpoint),
+                exec_after(
+                    bars,
+                    to_update,
+                    to_subscribe,
+                    to_provide,
+                )
+            )
+        finally:
+            if stats_path is not None:
+                stats.dump(stats_path)
 
 
 if __name__ == "__main__":
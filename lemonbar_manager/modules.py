@@ -0,0 +1,154 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+SECTIONS = ("before_left", "left", "center", "right")
+
+
+class ModuleRegistry:
+    """
+        Ordered registry of the bar's modules
+
+        Every section keeps an ordered list of module IDs, and `index` maps
+        a module ID to its (section, slot), so an update is a single dict
+        lookup. Each module's rendered fragment and each section's joined
+        output are cached; only sections touched since the last render
+        are re-joined.
+    """
+
+    def __init__(self, modules: Optional[Dict[str, Dict[str, str]]] = None):
+        self.order: Dict[str, List[str]] = {section: [] for section in SECTIONS}
+        self.index: Dict[str, Tuple[str, int]] = {}
+        self.values: Dict[str, str] = {}
+
+        # Render caches
+        self.fragments: Dict[str, str] = {}
+        self.sections: Dict[str, str] = {section: "" for section in SECTIONS}
+        self.dirty = set(SECTIONS)
+
+        for section, mods in (modules or {}).items():
+            for mod_id, mod_val in mods.items():
+                self.add(section, mod_id, mod_val)
+
+    def __contains__(self, mod_id):
+        return mod_id in self.index
+
+    def _check_section(self, section):
+        if section not in self.order:
+            raise KeyError(f"Unknown section: { section }")
+
+    def _check_mod(self, mod_id):
+        if mod_id not in self.index:
+            raise KeyError(f"Unknown module: { mod_id }")
+
+    def _check_pos(self, pos, size):
+        """ Returns the slot to insert at among `size` modules (None: last) """
+
+        if pos is None:
+            return size
+
+        if not isinstance(pos, int) or isinstance(pos, bool):
+            raise TypeError(f"Invalid position: { pos }")
+
+        if not 0 <= pos <= size:
+            raise ValueError(f"Position out of range: { pos }")
+
+        return pos
+
+    def _reindex(self, section):
+        for slot, mod_id in enumerate(self.order[section]):
+            self.index[mod_id] = (section, slot)
+
+        self.dirty.add(section)
+
+    def get(self, mod_id):
+        self._check_mod(mod_id)
+        return self.values[mod_id]
+
+    def update(self, mod_id, mod_val):
+        """ Sets a module's value; returns True if anything changed """
+
+        self._check_mod(mod_id)
+
+        if self.values[mod_id] == mod_val:
+            return False
+
+        self.values[mod_id] = mod_val
+        self.fragments.pop(mod_id, None)
+        self.dirty.add(self.index[mod_id][0])
+
+        return True
+
+    def add(self, section, mod_id, mod_val="", pos=None):
+        self._check_section(section)
+
+        if mod_id in self.index:
+            raise KeyError(f"Module already exists: { mod_id }")
+
+        mods = self.order[section]
+        mods.insert(self._check_pos(pos, len(mods)), mod_id)
+
+        self.values[mod_id] = mod_val
+        self._reindex(section)
+
+    def remove(self, mod_id):
+        self._check_mod(mod_id)
+
+        section, slot = self.index.pop(mod_id)
+        del self.order[section][slot]
+        del self.values[mod_id]
+        self.fragments.pop(mod_id, None)
+
+        self._reindex(section)
+
+    def move(self, mod_id, section, pos=None):
+        self._check_mod(mod_id)
+        self._check_section(section)
+
+        old_section, slot = self.index[mod_id]
+        mods = self.order[section]
+
+        # Validated before anything changes (the module leaves its slot first)
+        size = len(mods) - 1 if section == old_section else len(mods)
+        pos = self._check_pos(pos, size)
+
+        del self.order[old_section][slot]
+        mods.insert(pos, mod_id)
+
+        self._reindex(old_section)
+        self._reindex(section)
+
+    def invalidate(self):
+        """ Drops every rendered fragment (e.g. after a palette change) """
+
+        self.fragments.clear()
+        self.dirty.update(SECTIONS)
+
+    def render(self, replace_colors: Callable[[str], str]) -> Tuple[str, ...]:
+        """ Returns the rendered sections, re-joining only the dirty ones """
+
+        fragments = self.fragments
+        values = self.values
+
+        for section in self.dirty:
+            parts = []
+
+            for mod_id in self.order[section]:
+                fragment = fragments.get(mod_id)
+
+                if fragment is None:
+                    fragment = replace_colors(values[mod_id])
+                    fragments[mod_id] = fragment
+
+                parts.append(fragment)
+
+            self.sections[section] = "".join(parts)
+
+        self.dirty.clear()
+
+        return tuple(self.sections[section] for section in SECTIONS)
+
+    def to_dict(self):
+        return {
+            section: {mod_id: self.values[mod_id] for mod_id in mods}
+            for section, mods in self.order.items()
+        }
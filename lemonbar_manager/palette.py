@@ -0,0 +1,309 @@
+import os
+import json
+import asyncio
+import threading
+from random import choice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from files import cache_path, write_atomic
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp")
+
+DEFAULT_INDEX_PATH = cache_path("palettes.json")
+
+
+def get_colors(img_path: str) -> Dict:
+    # pywal is slow to import, and not needed at all while palettes are cached
+    import pywal
+
+    try:
+        return pywal.colors.get(img_path)
+    except SystemExit as err:
+        # pywal exits on images it can't use, which would stop the manager
+        raise ValueError(f"pywal can't use { img_path }") from err
+
+
+def change_wallpaper(img_path: str):
+    import pywal
+
+    try:
+        pywal.wallpaper.change(img_path)
+    except SystemExit as err:
+        raise ValueError(f"pywal can't set { img_path }") from err
+
+
+def _lower_priority():
+    """ Lowers the calling worker thread's priority (Linux: threads have their own nice value) """
+
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+class PaletteIndex:
+    """
+        On-disk index of every wallpaper's pywal colors
+
+        The directory is scanned once (and rescanned when its mtime changes),
+        and palettes are precomputed in the background by a single
+        low-priority worker. Entries are keyed on (path, size, mtime), so
+        switching to an indexed image never calls pywal.
+    """
+
+    def __init__(self, dir: str, path: Optional[str] = DEFAULT_INDEX_PATH):
+        self.dir = dir
+        self.path = path
+
+        self.images: List[str] = []
+        self.dir_mtime = None
+
+        # img_path -> [size, mtime, {"special": ..., "colors": ...}]
+        self.entries: Dict[str, list] = {}
+        # img_path -> (size, mtime) of images pywal failed on, not retried until they change
+        self.failed: Dict[str, Tuple[int, float]] = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, initializer=_lower_priority)
+
+        self.load()
+        self.scan()
+
+    def load(self):
+        if self.path is None:
+            return
+
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """ Atomically writes the index, if anything changed """
+
+        if self.path is None or not self.dirty:
+            return
+
+        with self.lock:
+            data = json.dumps(self.entries, separators=(",", ":"))
+            self.dirty = False
+
+        write_atomic(self.path, data)
+
+    def set_dir(self, dir: str):
+        self.dir = dir
+        self.dir_mtime = None
+        self.scan()
+
+    def scan(self):
+        """ Lists the directory's images; returns True if it changed since the last scan """
+
+        try:
+            mtime = os.stat(self.dir).st_mtime
+        except OSError:
+            self.images = []
+            return False
+
+        if mtime == self.dir_mtime:
+            return False
+
+        self.dir_mtime = mtime
+        self.images = sorted(
+            entry.name
+            for entry in os.scandir(self.dir)
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+
+        return True
+
+    def random_img(self):
+        """ A random image, among those pywal didn't fail on """
+
+        images = [
+            img for img in self.images
+            if os.path.join(self.dir, img) not in self.failed
+        ]
+        if not images:
+            raise ValueError(f"No usable image in { self.dir }")
+
+        return choice(images)
+
+    def lookup(self, img_path: str):
+        """ Returns the indexed pywal colors of an image, or None if missing/outdated """
+
+        entry = self.entries.get(img_path)
+        if entry is None:
+            return None
+
+        try:
+            st = os.stat(img_path)
+        except OSError:
+            return None
+
+        size, mtime, colors = entry
+        if (size, mtime) != (st.st_size, st.st_mtime):
+            return None
+
+        return colors
+
+    def store(self, img_path: str, colors: Dict):
+        try:
+            st = os.stat(img_path)
+        except OSError:
+            return
+
+        with self.lock:
+            self.entries[img_path] = [
+                st.st_size, st.st_mtime,
+                {"special": colors["special"], "colors": colors["colors"]},
+            ]
+            self.failed.pop(img_path, None)
+            self.dirty = True
+
+    def mark_failed(self, img_path: str):
+        """ Skips the image (when warming, or picking a random one) until it changes """
+
+        try:
+            st = os.stat(img_path)
+        except OSError:
+            return
+
+        self.failed[img_path] = (st.st_size, st.st_mtime)
+
+    def _compute(self, img_path: str):
+        if self.lookup(img_path) is not None:
+            return
+
+        try:
+            st = os.stat(img_path)
+        except OSError:
+            return
+
+        if self.failed.get(img_path) == (st.st_size, st.st_mtime):
+            return
+
+        try:
+            colors = get_colors(img_path)
+        except Exception as err:
+            self.mark_failed(img_path)
+            print(f"Couldn't index { img_path }: { err }")
+            return
+
+        self.store(img_path, colors)
+
+    async def warm(self):
+        """ Precomputes every missing palette on the low-priority worker """
+
+        loop = asyncio.get_running_loop()
+
+        for img in list(self.images):
+            img_path = os.path.join(self.dir, img)
+
+            try:
+                await loop.run_in_executor(self.executor, self._compute, img_path)
+            except Exception as err:
+                print(f"Couldn't index { img_path }: { err }")
+
+        await loop.run_in_executor(self.executor, self.save)
+
+    async def watch(self, interval: float = 10):
+        """ Warms the index, then rescans & re-warms whenever the directory changes """
+
+        await self.warm()
+
+        while True:
+            await asyncio.sleep(interval)
+
+            if self.scan():
+                await self.warm()
+            else:
+                # Palettes computed on demand since the last save
+                await asyncio.get_running_loop().run_in_executor(self.executor, self.save)
+
+
+class PaletteCache:
+    """
+        Memoizes pywal palettes keyed on (image path, mtime, alpha)
+
+        Looking up a palette costs a single `os.stat` on a hit;
+        `pywal.colors.get` is only called on a miss.
+    """
+
+    def __init__(self, index: Optional[PaletteIndex] = None):
+        self.entries: Dict[Tuple[str, float, str], Tuple[Dict, Dict]] = {}
+        self.index = index
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, img_path, alpha):
+        """ Returns (pywal colors, flat palette with alpha) for an image """
+
+        try:
+            mtime = os.stat(img_path).st_mtime
+        except OSError:
+            mtime = 0.0
+
+        key = (img_path, mtime, alpha)
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+
+        colors = self.index.lookup(img_path) if self.index is not None else None
+
+        if colors is None:
+            try:
+                colors = get_colors(img_path)
+            except ValueError:
+                if self.index is not None:
+                    self.index.mark_failed(img_path)
+                raise
+
+            if self.index is not None:
+                self.index.store(img_path, colors)
+
+        entry = (colors, build_palette(colors, alpha))
+
+        # Drop stale entries of the same image (older mtime)
+        for stale in [k for k in self.entries if k[0] == img_path and k[1] != mtime]:
+            del self.entries[stale]
+
+        self.entries[key] = entry
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "indexed": len(self.index.entries) if self.index is not None else 0,
+            "index_failed": len(self.index.failed) if self.index is not None else 0,
+        }
+
+
+def build_palette(colors, alpha):
+    """ Flattens every pywal color (special & colorN) into `name -> #AARRGGBB` """
+
+    palette = {
+        **colors["special"],
+        **colors["colors"],
+    }
+
+    # Insert alpha
+    for key, val in palette.items():
+        if val.startswith("#"):
+            palette[key] = val[0] + alpha + val[1:]
+
+    return palette
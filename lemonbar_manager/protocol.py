@@ -0,0 +1,166 @@
+"""
+    Wire formats of the manager protocol
+
+    JSON (the default):
+        {"cmd": "update_mod", "key": "date_time", "val": "12:00"}
+
+    Binary (a fixed header, then the key and value bytes):
+        magic (B), command id (B), flags (B), key length (H), value length (I)
+
+        - command id indexes COMMANDS (0 is reserved for replies)
+        - flags tell whether key/val are present and whether val is JSON
+          or a raw UTF-8 string (the common case, e.g. a module value)
+
+    The format is detected from a message's first byte (JSON never starts
+    with MAGIC), and replies use the format of the request. Requests
+    addressed to a single bar (a "bar" field) are always sent as JSON.
+"""
+
+import json
+import struct
+from typing import Dict, Tuple
+
+MAGIC = 0xB1
+
+HEADER = struct.Struct("!BBBHI")
+
+# Flags
+HAS_KEY = 0x1
+HAS_VAL = 0x2
+VAL_JSON = 0x4
+
+JSON = "json"
+BINARY = "binary"
+
+# Append only: a command's id is its position (0 is the reply id)
+COMMANDS = (
+    None,
+    "update_mod",
+    "add_mod",
+    "remove_mod",
+    "move_mod",
+    "get_mods",
+    "set_opt",
+    "get_opt",
+    "add_font",
+    "remove_font",
+    "clear_fonts",
+    "get_fonts",
+    "set_font_size",
+    "get_font_size",
+    "set_wallpaper",
+    "set_random_wallpaper",
+    "get_wallpaper",
+    "get_colors",
+    "set_alpha",
+    "get_alpha",
+    "batch",
+    "get_palette_stats",
+    "get_flush_stats",
+    "get_reload_stats",
+    "get_ipc_stats",
+    "get_update_stats",
+    "get_timers",
+    "add_timer",
+    "remove_timer",
+    "set_timer",
+    "get_subscriptions",
+    "list_commands",
+    "get_startup",
+    "get_state_stats",
+    "get_bars",
+    "get_action_stats",
+    "get_stats",
+)
+
+COMMAND_IDS = {cmd: i for i, cmd in enumerate(COMMANDS) if cmd is not None}
+
+EMPTY_REPLY = HEADER.pack(MAGIC, 0, 0, 0, 0)
+
+
+def encode_binary(cmd_id: int, key=None, val=None) -> bytes:
+    flags = 0
+    key_bytes = val_bytes = b""
+
+    if key is not None:
+        flags |= HAS_KEY
+        key_bytes = key.encode()
+
+    if val is not None:
+        flags |= HAS_VAL
+        if isinstance(val, str):
+            val_bytes = val.encode()
+        else:
+            flags |= VAL_JSON
+            val_bytes = json.dumps(val).encode()
+
+    return b"".join((
+        HEADER.pack(MAGIC, cmd_id, flags, len(key_bytes), len(val_bytes)),
+        key_bytes,
+        val_bytes,
+    ))
+
+
+def decode_binary(payload: bytes) -> Tuple[int, object, object]:
+    _, cmd_id, flags, key_len, val_len = HEADER.unpack_from(payload)
+
+    offset = HEADER.size
+    key = val = None
+
+    if flags & HAS_KEY:
+        key = payload[offset:offset + key_len].decode()
+    offset += key_len
+
+    if flags & HAS_VAL:
+        val = payload[offset:offset + val_len]
+        val = json.loads(val) if flags & VAL_JSON else val.decode()
+
+    return cmd_id, key, val
+
+
+def encode_request(obj: Dict, fmt: str = JSON) -> bytes:
+    # The binary header has no room for a bar name
+    if fmt == JSON or obj.get("bar") is not None:
+        return json.dumps(obj).encode()
+
+    return encode_binary(COMMAND_IDS[obj["cmd"]], obj.get("key"), obj.get("val"))
+
+
+def decode_request(payload: bytes) -> Tuple[Dict, str]:
+    """ Returns (request, format); raises ValueError on malformed messages """
+
+    if payload[:1] != bytes((MAGIC,)):
+        obj = json.loads(payload)
+        if not isinstance(obj, dict):
+            raise ValueError("Expected a JSON object")
+
+        return obj, JSON
+
+    try:
+        cmd_id, key, val = decode_binary(payload)
+    except (struct.error, UnicodeDecodeError) as err:
+        raise ValueError(f"Malformed binary message: { err }")
+
+    if not 0 < cmd_id < len(COMMANDS):
+        raise ValueError(f"Unknown command id: { cmd_id }")
+
+    return {"cmd": COMMANDS[cmd_id], "key": key, "val": val}, BINARY
+
+
+def encode_reply(rep, fmt: str = JSON) -> bytes:
+    if fmt == JSON:
+        return json.dumps(rep).encode()
+
+    # Most replies are empty, they're a bare header
+    if rep == {}:
+        return EMPTY_REPLY
+
+    return encode_binary(0, val=rep)
+
+
+def decode_reply(payload: bytes):
+    if payload[:1] != bytes((MAGIC,)):
+        return json.loads(payload)
+
+    _, _, val = decode_binary(payload)
+    return val if val is not None else {}
@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import inspect
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Union
+
+import stats
+
+Provider = Union[
+    Callable[[], AsyncIterator[str]],
+    Callable[[], Awaitable[str]],
+    Callable[[], str],
+]
+
+
+async def run_command(cmd: List[str]) -> int:
+    """ Runs an external command to completion (so no zombies are left behind) """
+
+    start = time.perf_counter()
+    ps = await asyncio.create_subprocess_exec(*cmd)
+    stats.observe("spawn.command", time.perf_counter() - start)
+
+    return await ps.wait()
+
+
+async def poll(provider: Provider) -> Optional[str]:
+    """ Calls a coroutine or plain function provider once """
+
+    val = provider()
+
+    if inspect.isawaitable(val):
+        val = await val
+
+    return val
+
+
+async def update_once(bar, mod_id: str, provider: Provider) -> None:
+    """ Polls a provider once and pushes its value to the bar """
+
+    val = await poll(provider)
+
+    if val is not None:
+        bar.update_mod(mod_id, val)
+        bar.flush_mods()
+
+
+async def run_provider(bar, mod_id: str, provider: Provider, *,
+                       backoff: float = 1,
+                       max_backoff: float = 60,
+                       ) -> None:
+    """
+        Feeds a module's values from an in-process provider
+
+        A provider is either:
+            - an async generator function, yielding a new value whenever it has one
+              (run here, restarted with exponential backoff when it fails)
+            - a coroutine (or plain) function, polled by the timer scheduler
+              through update_once
+
+        A provider returning/yielding None leaves the module untouched.
+    """
+
+    delay = backoff
+    loop = asyncio.get_running_loop()
+
+    while True:
+        started = loop.time()
+
+        try:
+            async for val in provider():
+                if val is not None:
+                    bar.update_mod(mod_id, val)
+                    bar.flush_mods()
+            return
+        except Exception as err:
+            print(f"Provider { mod_id } failed: { err }")
+
+        # Reset the backoff if the provider was up for a while
+        if loop.time() - started > max_backoff:
+            delay = backoff
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_backoff)
+
+
+def date_time(fmt: str = "%a %d %b %H:%M:%S", *,
+              prefix: str = "", suffix: str = "") -> Callable[[], str]:
+    """ Built-in date & time provider (`time.strftime` format) """
+
+    def _provide():
+        return f"{ prefix }{ time.strftime(fmt) }{ suffix }"
+
+    return _provide
+
+
+def battery(name: str = "BAT0", fmt: str = "{capacity}%", *,
+            prefix: str = "", suffix: str = "",
+            sysfs: str = "/sys/class/power_supply") -> Callable[[], Optional[str]]:
+    """
+        Built-in battery provider reading `/sys/class/power_supply/<name>` directly
+
+        `fmt` is a `str.format` string receiving `capacity` and `status`
+        (e.g. "Charging", "Discharging", "Full").
+    """
+
+    path = os.path.join(sysfs, name)
+
+    def _read(attr):
+        with open(os.path.join(path, attr)) as f:
+            return f.read().strip()
+
+    def _provide():
+        try:
+            capacity = _read("capacity")
+            status = _read("status")
+        except OSError:
+            return None
+
+        return f"{ prefix }{ fmt.format(capacity=capacity, status=status) }{ suffix }"
+
+    return _provide
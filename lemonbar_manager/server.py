@@ -0,0 +1,143 @@
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Set, Tuple
+
+import stats
+import protocol
+
+# Commands cheap enough to run straight from the receive loop
+FAST_COMMANDS = ("update_mod",)
+
+
+class Server:
+    """
+        Concurrent request dispatcher for a ZeroMQ ROUTER socket
+
+        Requests from different clients run concurrently (at most
+        `max_inflight` at once), requests from the same client run in order.
+        Cheap commands (update_mod) from an idle client are handled straight
+        from the receive loop, so they never wait behind slow ones.
+
+        Works with REQ clients (envelope: identity, empty delimiter) as well
+        as DEALER clients (envelope: identity). Each message may be JSON or
+        binary (see protocol.py); it's replied to in the same format.
+    """
+
+    def __init__(self, sock, handler: Callable[[Dict], Awaitable[Dict]], *,
+                 max_inflight: int = 16,
+                 ):
+        self.sock = sock
+        self.handler = handler
+        self.semaphore = asyncio.Semaphore(max_inflight)
+
+        # client identity -> pending (envelope, request, format, received at)
+        self.queues: Dict[bytes, Deque[Tuple[List[bytes], Dict, str, float]]] = {}
+        # Running _drain tasks (referenced, so they can't be collected mid-run)
+        self.drains: Set[asyncio.Task] = set()
+
+        # Metrics
+        self.received = 0
+        self.fast_path = 0
+        self.queued = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self.max_queue_depth = 0
+        self.formats = {protocol.JSON: 0, protocol.BINARY: 0}
+
+    def queue_depth(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    async def reply(self, envelope: List[bytes], rep: Dict, fmt: str = protocol.JSON):
+        start = time.perf_counter()
+        await self.sock.send_multipart([*envelope, protocol.encode_reply(rep, fmt)])
+        stats.observe("ipc.reply", time.perf_counter() - start)
+
+    async def handle(self, obj: Dict) -> Dict:
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        start = time.perf_counter()
+
+        try:
+            return await self.handler(obj)
+        except Exception as err:
+            stats.incr("ipc.internal_errors")
+            return {"error": f"Internal error: { err }"}
+        finally:
+            self.inflight -= 1
+            stats.observe("ipc.handle", time.perf_counter() - start)
+
+    async def run(self):
+        while True:
+            *envelope, payload = await self.sock.recv_multipart()
+            self.received += 1
+            received_at = time.perf_counter()
+
+            try:
+                obj, fmt = protocol.decode_request(payload)
+            except ValueError as err:
+                stats.incr("ipc.invalid")
+                await self.reply(envelope, {"error": f"Invalid message: { err }"})
+                continue
+
+            stats.observe("ipc.decode", time.perf_counter() - received_at)
+
+            self.formats[fmt] += 1
+            client = envelope[0]
+
+            if client not in self.queues and obj.get("cmd") in FAST_COMMANDS:
+                self.fast_path += 1
+                await self.reply(envelope, await self.handle(obj), fmt)
+                stats.observe("ipc.request", time.perf_counter() - received_at)
+                continue
+
+            self.queued += 1
+
+            queue = self.queues.get(client)
+            if queue is None:
+                queue = self.queues[client] = deque()
+
+                drain = asyncio.create_task(self._drain(client, queue))
+                self.drains.add(drain)
+                drain.add_done_callback(self._drained)
+
+            queue.append((envelope, obj, fmt, received_at))
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+
+    async def _drain(self, client: bytes, queue: Deque):
+        """ Runs a client's requests one after another """
+
+        try:
+            while queue:
+                envelope, obj, fmt, received_at = queue[0]
+
+                async with self.semaphore:
+                    stats.observe("ipc.queue_wait", time.perf_counter() - received_at)
+                    rep = await self.handle(obj)
+
+                queue.popleft()
+                await self.reply(envelope, rep, fmt)
+                stats.observe("ipc.request", time.perf_counter() - received_at)
+        finally:
+            del self.queues[client]
+
+    def _drained(self, task: asyncio.Task):
+        self.drains.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            # e.g. the reply couldn't be sent
+            stats.incr("ipc.internal_errors")
+            print(f"Request queue failed: { task.exception() }")
+
+    def get_stats(self):
+        return {
+            "received": self.received,
+            "fast_path": self.fast_path,
+            "queued": self.queued,
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "clients_pending": len(self.queues),
+            "formats": self.formats,
+        }
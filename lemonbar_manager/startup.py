@@ -0,0 +1,35 @@
+import sys
+import time
+
+# Set as early as possible: manager.py imports this module first
+START = time.perf_counter()
+
+marks = {}
+
+
+def mark(name: str):
+    """ Records when a startup phase completed (only its first occurrence) """
+
+    if name not in marks:
+        marks[name] = time.perf_counter() - START
+
+
+def get_report():
+    """ Phases in order, with their time since start and since the previous phase (ms) """
+
+    report = []
+    prev = 0.0
+
+    for name, at in sorted(marks.items(), key=lambda item: item[1]):
+        report.append({"phase": name, "at": at * 1000, "delta": (at - prev) * 1000})
+        prev = at
+
+    return report
+
+
+def print_report(file=sys.stderr):
+    """ Prints the phases in an `-X importtime`-like table """
+
+    print("startup: cumulative | self | phase", file=file)
+    for row in get_report():
+        print(f"startup: { row['at']:>8.1f}ms | { row['delta']:>8.1f}ms | { row['phase'] }", file=file)
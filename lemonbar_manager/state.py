@@ -0,0 +1,120 @@
+import json
+import asyncio
+from typing import Callable, Dict, Optional
+
+from files import cache_path, display_id, write_atomic
+
+# One per X display, like the endpoints: managers on other displays have their own bars
+DEFAULT_STATE_PATH = cache_path(f"state-{ display_id() }.json")
+
+
+def load_state(path: Optional[str] = DEFAULT_STATE_PATH) -> Dict:
+    if path is None:
+        return {}
+
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return state if isinstance(state, dict) else {}
+
+
+def save_state(state: Dict, path: Optional[str] = DEFAULT_STATE_PATH):
+    """ Atomically writes the state file """
+
+    if path is None:
+        return
+
+    write_atomic(path, json.dumps(state, separators=(",", ":")))
+
+
+def restore_settings(config: Dict, state: Dict) -> Dict:
+    """
+        Settings to start with: the last run's, where `config` is unchanged
+
+        A setting edited in the config since the last run takes its new
+        value, the others are restored as they were left.
+    """
+
+    saved_config = state.get("config", {})
+    saved = state.get("settings", {})
+
+    return {
+        key: (
+            saved[key]
+            if key in saved and key in saved_config and saved_config[key] == val else
+            val
+        )
+        for key, val in config.items()
+    }
+
+
+class StateWriter:
+    """
+        Debounced, atomic snapshots of `snapshot()` to `path`
+
+        A request schedules a write `delay` seconds later, and requests in
+        the meantime are folded into it: a module ticking every second costs
+        a write per `delay`, not per tick. Unchanged snapshots aren't written.
+    """
+
+    def __init__(self, snapshot: Callable[[], Dict],
+                 path: Optional[str] = DEFAULT_STATE_PATH, *,
+                 delay: float = 30,
+                 ):
+        self.snapshot = snapshot
+        self.path = path
+        self.delay = delay
+
+        self.handle = None
+        self.last = None
+
+        # Stats
+        self.requested = 0
+        self.written = 0
+        self.unchanged = 0
+
+    def request(self):
+        self.requested += 1
+
+        if self.path is None or self.handle is not None:
+            return
+
+        loop = asyncio.get_running_loop()
+        self.handle = loop.call_later(self.delay, self.write)
+
+    def write(self):
+        """ Writes a snapshot now (if it changed since the last write) """
+
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+        if self.path is None:
+            return
+
+        state = self.snapshot()
+        if state == self.last:
+            self.unchanged += 1
+            return
+
+        try:
+            save_state(state, self.path)
+        except OSError as err:
+            print(f"Couldn't save the state: { err }")
+            return
+
+        self.last = state
+        self.written += 1
+
+    def get_stats(self):
+        return {
+            "path": self.path,
+            "delay": self.delay,
+            "pending": self.handle is not None,
+            "requested": self.requested,
+            "written": self.written,
+            "unchanged": self.unchanged,
+        }
@@ -0,0 +1,119 @@
+"""
+    Process-wide latency histograms & counters
+
+    Cheap enough to stay on: recording is a bisect into fixed buckets and
+    a few additions, no allocation. Call sites time their stage with
+    time.perf_counter():
+
+        start = time.perf_counter()
+        ...
+        stats.observe("flush.write", time.perf_counter() - start)
+"""
+
+import json
+import asyncio
+from bisect import bisect_left
+from typing import Dict, Optional
+
+from files import write_atomic
+
+# Buckets' upper bounds (ms); the last bucket holds everything slower
+BOUNDS_MS = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000,
+)
+_BOUNDS = tuple(bound / 1000 for bound in BOUNDS_MS)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """ Upper bound (ms) of the bucket holding the q-quantile (at most the max) """
+
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if i < len(BOUNDS_MS):
+                    return min(BOUNDS_MS[i], self.max * 1000)
+                return self.max * 1000
+
+        return self.max * 1000
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else None,
+            "max_ms": self.max * 1000,
+            "p50_ms": self.quantile(.5),
+            "p99_ms": self.quantile(.99),
+            "buckets": self.counts,
+        }
+
+
+histograms: Dict[str, Histogram] = {}
+counters: Dict[str, int] = {}
+
+
+def observe(name: str, seconds: float):
+    hist = histograms.get(name)
+    if hist is None:
+        hist = histograms[name] = Histogram()
+
+    hist.observe(seconds)
+
+
+def incr(name: str, n: int = 1):
+    counters[name] = counters.get(name, 0) + n
+
+
+def get_stats():
+    return {
+        "bounds_ms": BOUNDS_MS,
+        "counters": dict(sorted(counters.items())),
+        "histograms": {
+            name: hist.to_dict()
+            for name, hist in sorted(histograms.items())
+        },
+    }
+
+
+def reset():
+    histograms.clear()
+    counters.clear()
+
+
+def dump(path: str):
+    """ Atomically writes the stats to `path` (JSON) """
+
+    write_atomic(path, json.dumps(get_stats()))
+
+
+async def dump_every(path: str, interval: float = 60):
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            dump(path)
+        except OSError as err:
+            print(f"Couldn't dump the stats: { err }")
@@ -0,0 +1,199 @@
+import time
+import asyncio
+import inspect
+from typing import Callable, Dict, List, Tuple, Union
+
+import stats
+from providers import run_command
+
+Target = Union[List[str], Callable[[str], None]]
+
+
+class Handler:
+    """
+        An event handler, either an in-process callable (receiving the event
+        line) or an external command, with a trailing-edge debounce
+
+        Events arriving during the debounce are merged into the coming run,
+        and those arriving while it runs into a single follow-up run: the
+        handler never overlaps itself, and runs at most once per debounce
+        period, whatever the event rate.
+    """
+
+    def __init__(self, target: Target, debounce: float = 0.05):
+        self.target = target
+        self.debounce = debounce
+
+        self.line = ""
+        self.task = None
+        self.again = False
+
+        # Counters
+        self.triggered = 0
+        self.runs = 0
+        self.failed = 0
+
+    @property
+    def name(self):
+        return getattr(self.target, "__name__", None) or " ".join(self.target)
+
+    def trigger(self, line: str):
+        self.triggered += 1
+        self.line = line
+
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        else:
+            self.again = True
+
+    async def _run(self):
+        try:
+            while True:
+                if self.debounce:
+                    await asyncio.sleep(self.debounce)
+
+                # Events from now on need another run
+                self.again = False
+
+                try:
+                    await self._call(self.line)
+                except Exception as err:
+                    self.failed += 1
+                    print(f"Handler { self.name } failed: { err }")
+
+                if not self.again:
+                    break
+        finally:
+            self.task = None
+
+    async def _call(self, line):
+        self.runs += 1
+
+        if callable(self.target):
+            rep = self.target(line)
+            if inspect.isawaitable(rep):
+                await rep
+        else:
+            await run_command(self.target)
+
+
+class Source:
+    """
+        A long-lived event source (e.g. `bspc subscribe ...`) whose stdout
+        lines are fanned out to its handlers
+
+        The source is restarted with exponential backoff when it dies.
+    """
+
+    def __init__(self, cmd: Tuple[str, ...], *,
+                 backoff: float = 1,
+                 max_backoff: float = 60,
+                 ):
+        self.cmd = cmd
+        self.handlers: List[Handler] = []
+
+        self.min_backoff = backoff
+        self.max_backoff = max_backoff
+
+        # Counters
+        self.events = 0
+        self.restarts = 0
+
+    def add_handler(self, handler: Handler):
+        if handler not in self.handlers:
+            self.handlers.append(handler)
+
+    def dispatch(self, line: str):
+        for handler in self.handlers:
+            handler.trigger(line)
+
+    async def run(self):
+        backoff = self.min_backoff
+        loop = asyncio.get_running_loop()
+
+        while True:
+            started = loop.time()
+
+            try:
+                spawn_start = time.perf_counter()
+                ps = await asyncio.create_subprocess_exec(
+                    *self.cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                stats.observe("spawn.source", time.perf_counter() - spawn_start)
+            except OSError as err:
+                print(f"Couldn't start { ' '.join(self.cmd) }: { err }")
+            else:
+                # Initial render, and catch up on anything missed while down
+                self.dispatch("")
+
+                while line := await ps.stdout.readline():
+                    self.events += 1
+                    self.dispatch(line.decode().rstrip("\n"))
+
+                await ps.wait()
+
+            # Reset the backoff if the source was up for a while
+            if loop.time() - started > self.max_backoff:
+                backoff = self.min_backoff
+
+            self.restarts += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+
+class SubscriptionEngine:
+    """
+        Deduplicates event sources and handlers
+
+        Identical source commands share a single child process, and identical
+        handler commands (or the same callable) share a single debounced
+        handler, even across sources. So a burst of events from several
+        sources runs a shared callback once. A shared handler has a single
+        debounce: subscribing it again with another one is an error.
+    """
+
+    def __init__(self):
+        self.sources: Dict[Tuple[str, ...], Source] = {}
+        self.handlers: Dict[object, Handler] = {}
+
+    def subscribe(self, ev: List[str], cb: Target, debounce: float = 0.05):
+        source = self.sources.get(tuple(ev))
+        if source is None:
+            source = self.sources[tuple(ev)] = Source(tuple(ev))
+
+        key = cb if callable(cb) else tuple(cb)
+        handler = self.handlers.get(key)
+        if handler is None:
+            handler = self.handlers[key] = Handler(cb, debounce)
+        elif handler.debounce != debounce:
+            raise ValueError(
+                f"{ handler.name } already subscribed with a { handler.debounce }s debounce")
+
+        source.add_handler(handler)
+
+    async def run(self):
+        await asyncio.gather(*(
+            source.run()
+            for source in self.sources.values()
+        ))
+
+    def get_stats(self):
+        return {
+            "sources": {
+                " ".join(cmd): {
+                    "events": source.events,
+                    "restarts": source.restarts,
+                }
+                for cmd, source in self.sources.items()
+            },
+            "handlers": {
+                handler.name: {
+                    "triggered": handler.triggered,
+                    "runs": handler.runs,
+                    "failed": handler.failed,
+                }
+                for handler in self.handlers.values()
+            },
+        }
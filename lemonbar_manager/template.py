@@ -0,0 +1,40 @@
+import re
+from functools import lru_cache
+from typing import Dict, Tuple
+
+
+PLACEHOLDER = re.compile(r"\$\{(\w+)\}")
+
+
+@lru_cache(maxsize=1024)
+def compile_template(string: str) -> Tuple[str, ...]:
+    """
+        Parses a string once into alternating literal and placeholder segments
+
+        Even indices hold literals, odd indices hold placeholder names:
+            "a${color1}b" -> ("a", "color1", "b")
+
+        Compiled templates are cached per string value, so a repeated
+        value costs a single dict lookup.
+    """
+
+    return tuple(PLACEHOLDER.split(string))
+
+
+def render(template: Tuple[str, ...], palette: Dict[str, str]) -> str:
+    """ Renders a compiled template in a single join; unknown names are kept as is """
+
+    if len(template) == 1:
+        return template[0]
+
+    parts = list(template)
+
+    for i in range(1, len(parts), 2):
+        name = parts[i]
+        parts[i] = palette.get(name, f"${{{ name }}}")
+
+    return "".join(parts)
+
+
+def replace_colors(string: str, palette: Dict[str, str]) -> str:
+    return render(compile_template(string), palette)
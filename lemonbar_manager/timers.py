@@ -0,0 +1,186 @@
+import time
+import heapq
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+
+class Job:
+    def __init__(self, name: str, interval: float,
+                 callback: Callable[[], Awaitable[None]], align: bool = True):
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.align = align
+
+        # Bumped on every reschedule, so stale heap entries can be skipped
+        self.generation = 0
+        self.task = None
+
+        # Stats
+        self.runs = 0
+        self.skipped = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+        self.last_runtime = 0.0
+        self.max_runtime = 0.0
+        self.total_runtime = 0.0
+
+    def get_stats(self):
+        runs = self.runs or 1
+
+        return {
+            "interval": self.interval,
+            "align": self.align,
+            "running": self.task is not None,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "lateness": {
+                "last": self.last_lateness,
+                "max": self.max_lateness,
+                "avg": self.total_lateness / runs,
+            },
+            "runtime": {
+                "last": self.last_runtime,
+                "max": self.max_runtime,
+                "avg": self.total_runtime / runs,
+            },
+        }
+
+
+class TimerScheduler:
+    """
+        Runs every periodic job from a single heap
+
+        Deadlines are computed from the schedule, not from when a job last
+        ran, so jobs don't drift. Aligned jobs fire on wall-clock multiples
+        of their interval (a 1s clock changes on the second). A job still
+        running when it's due again skips that tick instead of stacking.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self.heap: List[Tuple[float, int, str]] = []
+        self.wakeup = asyncio.Event()
+
+    def _next_due(self, job: Job, after: float) -> float:
+        """ First deadline (loop time) strictly after `after` """
+
+        loop = asyncio.get_running_loop()
+
+        if job.align:
+            # Convert to wall clock, snap to the next boundary, convert back
+            # (with 1ms of slack, as the clock offset jitters between calls)
+            offset = time.time() - loop.time()
+            wall = after + offset + 1e-3
+            boundary = (wall // job.interval + 1) * job.interval
+            return boundary - offset
+
+        return after + job.interval
+
+    def _schedule(self, job: Job, due: float):
+        job.generation += 1
+        heapq.heappush(self.heap, (due, job.generation, job.name))
+        self.wakeup.set()
+
+    def add(self, name: str, interval: float,
+            callback: Callable[[], Awaitable[None]], align: bool = True):
+        if name in self.jobs:
+            raise KeyError(f"Timer already exists: { name }")
+        if interval <= 0:
+            raise ValueError(f"Invalid interval: { interval }")
+
+        job = self.jobs[name] = Job(name, interval, callback, align)
+
+        # Run right away so modules aren't blank until their first tick
+        loop = asyncio.get_running_loop()
+        self._schedule(job, loop.time())
+
+    def remove(self, name: str):
+        if name not in self.jobs:
+            raise KeyError(f"Unknown timer: { name }")
+
+        job = self.jobs.pop(name)
+        job.generation += 1
+
+        if job.task is not None:
+            job.task.cancel()
+
+    def retune(self, name: str, interval: float):
+        if name not in self.jobs:
+            raise KeyError(f"Unknown timer: { name }")
+        if interval <= 0:
+            raise ValueError(f"Invalid interval: { interval }")
+
+        job = self.jobs[name]
+        job.interval = interval
+
+        loop = asyncio.get_running_loop()
+        self._schedule(job, self._next_due(job, loop.time()))
+
+    async def _execute(self, job: Job, due: float):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        lateness = start - due
+        job.last_lateness = lateness
+        job.max_lateness = max(job.max_lateness, lateness)
+        job.total_lateness += lateness
+
+        try:
+            await job.callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            print(f"Timer { job.name } failed: { err }")
+        finally:
+            runtime = loop.time() - start
+            job.runs += 1
+            job.last_runtime = runtime
+            job.max_runtime = max(job.max_runtime, runtime)
+            job.total_runtime += runtime
+            job.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            self.wakeup.clear()
+
+            # Fire everything that's due
+            now = loop.time()
+            while self.heap and self.heap[0][0] <= now:
+                due, generation, name = heapq.heappop(self.heap)
+
+                job = self.jobs.get(name)
+                if job is None or job.generation != generation:
+                    # Removed or rescheduled
+                    continue
+
+                if job.task is not None:
+                    job.skipped += 1
+                else:
+                    job.task = asyncio.create_task(self._execute(job, due))
+
+                # Next deadline follows the schedule; if we've fallen a
+                # whole tick behind, resume from now instead of bursting
+                next_due = self._next_due(job, due)
+                if next_due <= now:
+                    job.skipped += 1
+                    next_due = self._next_due(job, now)
+
+                self._schedule(job, next_due)
+                self.wakeup.clear()
+
+            timeout = self.heap[0][0] - loop.time() if self.heap else None
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self):
+        return {
+            name: job.get_stats()
+            for name, job in self.jobs.items()
+        }
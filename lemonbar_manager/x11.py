@@ -0,0 +1,137 @@
+import time
+import select
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+try:
+    from Xlib import X, error
+    from Xlib.display import Display
+except ImportError:
+    # Optional: without python-xlib, Bar falls back to xdo
+    Display = None
+
+
+class X11:
+    """
+        In-process window tracking & stacking (python-xlib)
+
+        Windows are matched by their WM_NAME, unique to each lemonbar (set
+        with `-n`), so each bar finds its own lemonbar even with several
+        running. Map events are selected on the root window only while
+        waiting (before looking for the window, so none is missed), and
+        whatever was queued meanwhile is dropped afterwards: nothing piles
+        up between reloads.
+
+        Xlib connections aren't thread safe: every call runs on one worker
+        thread, off the event loop.
+    """
+
+    def __init__(self, display_name: Optional[str] = None):
+        self.display = Display(display_name)
+        self.root = self.display.screen().root
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="x11")
+
+    def _get_name(self, win) -> Optional[str]:
+        try:
+            return win.get_wm_name()
+        except error.XError:
+            # Destroyed in the meantime
+            return None
+
+    def _match(self, win, wm_name: str):
+        """ `win` or its child (if reparented by the window manager) with the given WM_NAME """
+
+        if self._get_name(win) == wm_name:
+            return win
+
+        try:
+            children = win.query_tree().children
+        except error.XError:
+            return None
+
+        for child in children:
+            if self._get_name(child) == wm_name:
+                return child
+
+        return None
+
+    def _find_window(self, wm_name: str):
+        for win in self.root.query_tree().children:
+            match = self._match(win, wm_name)
+            if match is not None:
+                return match
+
+        return None
+
+    def _wait_for_window(self, wm_name: str, timeout: float) -> Optional[int]:
+        self.root.change_attributes(event_mask=X.SubstructureNotifyMask)
+        self.display.sync()
+
+        try:
+            return self._wait_mapped(wm_name, timeout)
+        finally:
+            self.root.change_attributes(event_mask=X.NoEventMask)
+            self.display.sync()
+
+            # Events of other windows, received while waiting
+            while self.display.pending_events():
+                self.display.next_event()
+
+    def _wait_mapped(self, wm_name: str, timeout: float) -> Optional[int]:
+        deadline = time.monotonic() + timeout
+
+        win = self._find_window(wm_name)
+
+        while win is None:
+            # Map events queued meanwhile
+            while win is None and self.display.pending_events():
+                event = self.display.next_event()
+                if event.type == X.MapNotify:
+                    win = self._match(event.window, wm_name)
+
+            if win is not None:
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+
+            select.select([self.display], [], [], remaining)
+
+        return win.id
+
+    def _lower(self, win_id: int):
+        """ Puts the window at the bottom of the stack (behind full-screen programs) """
+
+        win = self.display.create_resource_object("window", win_id)
+        win.configure(stack_mode=X.Below)
+        self.display.sync()
+
+    async def wait_for_window(self, wm_name: str, timeout: float = 5) -> Optional[int]:
+        """ Waits for the window named `wm_name` to be mapped, returns its id (None on timeout) """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._wait_for_window, wm_name, timeout)
+
+    async def lower(self, win_id: int):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._lower, win_id)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.display.close()
+
+
+def connect(display_name: Optional[str] = None) -> Optional[X11]:
+    """ Opens the X display, or returns None (no python-xlib, no display) """
+
+    if Display is None:
+        return None
+
+    try:
+        return X11(display_name)
+    except Exception as err:
+        print(f"Can't use python-xlib, falling back to xdo: { err }")
+        return None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The manager's modules import each other by name, like manager.py does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lemonbar_manager"))
@@ -0,0 +1,116 @@
+import asyncio
+
+from flush import FlushScheduler
+
+
+class FakeStdin:
+    def __init__(self, broken=False):
+        self.frames = []
+        self.broken = broken
+
+    def write(self, data):
+        if self.broken:
+            raise BrokenPipeError()
+        self.frames.append(data.decode())
+
+    async def drain(self):
+        pass
+
+
+def make(**kwargs):
+    state = {"line": "a"}
+    flusher = FlushScheduler(lambda: state["line"], **kwargs)
+    stdin = FakeStdin()
+    flusher.attach(stdin)
+    return flusher, stdin, state
+
+
+def test_requests_are_coalesced():
+    async def main():
+        flusher, stdin, _ = make(window=0.01)
+
+        for _ in range(10):
+            flusher.request()
+        await asyncio.sleep(0.05)
+
+        return flusher, stdin
+
+    flusher, stdin = asyncio.run(main())
+
+    assert stdin.frames == ["a\n"]
+    assert flusher.get_stats() == {"requested": 10, "coalesced": 9, "emitted": 1, "unchanged": 0}
+
+
+def test_unchanged_frames_are_skipped():
+    async def main():
+        flusher, stdin, state = make()
+
+        await flusher.flush()
+        await flusher.flush()
+        state["line"] = "b"
+        await flusher.flush()
+
+        return flusher, stdin
+
+    flusher, stdin = asyncio.run(main())
+
+    assert stdin.frames == ["a\n", "b\n"]
+    assert flusher.unchanged == 1
+
+
+def test_fps_cap():
+    async def main():
+        flusher, stdin, state = make(window=0, max_fps=10)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        # A new value every 5ms for 0.35s
+        while loop.time() - start < 0.35:
+            state["line"] = str(loop.time())
+            flusher.request()
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.15)
+
+        return stdin
+
+    stdin = asyncio.run(main())
+
+    # One frame per 100ms at most
+    assert 3 <= len(stdin.frames) <= 5
+
+
+def test_attach_resends_the_frame():
+    async def main():
+        flusher, stdin, _ = make()
+        await flusher.flush()
+
+        new_stdin = FakeStdin()
+        flusher.attach(new_stdin)
+        await flusher.flush()
+
+        return stdin, new_stdin
+
+    stdin, new_stdin = asyncio.run(main())
+
+    assert stdin.frames == new_stdin.frames == ["a\n"]
+
+
+def test_broken_pipe_detaches():
+    async def main():
+        flusher = FlushScheduler(lambda: "a")
+        flusher.attach(FakeStdin(broken=True))
+        await flusher.flush()
+        return flusher
+
+    assert asyncio.run(main()).stdin is None
+
+
+def test_cancel():
+    async def main():
+        flusher, stdin, _ = make(window=0.02)
+        flusher.request()
+        flusher.cancel()
+        await asyncio.sleep(0.05)
+        return stdin
+
+    assert asyncio.run(main()).frames == []
@@ -0,0 +1,112 @@
+import sys
+import types
+import asyncio
+
+import pytest
+
+from group import BarGroup
+
+COLORS = {"special": {"foreground": "#eeeeee"}, "colors": {"color1": "#ff0000"}}
+
+
+@pytest.fixture
+def wallpapers(tmp_path, monkeypatch):
+    """ A wallpaper directory, and a stand-in pywal recording wallpaper changes """
+
+    for name in ("a.png", "b.png"):
+        (tmp_path / name).write_bytes(b"x")
+
+    changes = []
+    module = types.ModuleType("pywal")
+    module.colors = types.SimpleNamespace(get=lambda img_path: COLORS)
+    module.wallpaper = types.SimpleNamespace(change=changes.append)
+    monkeypatch.setitem(sys.modules, "pywal", module)
+
+    return tmp_path, changes
+
+
+@pytest.fixture
+def group(wallpapers):
+    common = {
+        "dir": str(wallpapers[0]), "img": "a.png",
+        "palette_index": None, "state_path": None, "xlib": False,
+    }
+
+    return BarGroup([
+        {**common, "name": "left", "modules": {"left": {"clock": "", "desktops": ""}}},
+        {**common, "name": "right", "geometry": "1920x30+1920+0", "modules": {"left": {"clock": ""}}},
+    ])
+
+
+def execute(group, **obj):
+    """ (reply, names of the bars to reload) """
+
+    rep, to_reload = asyncio.run(group.execute(obj))
+    return rep, sorted(name for name, bar in group.bars.items() if bar in to_reload)
+
+
+def test_update_mod_reaches_every_bar_showing_it(group):
+    assert execute(group, cmd="update_mod", key="clock", val="12:00") == ({}, [])
+    assert execute(group, cmd="update_mod", key="desktops", val="1") == ({}, [])
+
+    assert group.bars["left"].modules.get("clock") == "12:00"
+    assert group.bars["right"].modules.get("clock") == "12:00"
+    assert group.bars["left"].modules.get("desktops") == "1"
+
+    rep, _ = execute(group, cmd="update_mod", key="nope", val="x")
+    assert rep == {"error": "Unknown module: nope"}
+
+
+def test_bar_field_targets_one_bar(group):
+    assert execute(group, cmd="set_opt", key="-B", val="#111111", bar="right") == ({}, ["right"])
+
+    assert group.bars["left"].options["-B"] == "#000000"
+    assert group.bars["right"].options["-B"] == "#111111"
+
+    assert execute(group, cmd="get_opt", key="-g", bar="right") == ("1920x30+1920+0", [])
+    assert execute(group, cmd="get_opt", key="-g", bar="top") == ({"error": "Unknown bar: top"}, [])
+
+
+def test_mutators_are_broadcast(group):
+    assert execute(group, cmd="set_opt", key="-B", val="#111111") == ({}, ["left", "right"])
+    assert {bar.options["-B"] for bar in group.bars.values()} == {"#111111"}
+
+    # Succeeds as long as a bar accepts it
+    assert execute(group, cmd="remove_mod", key="desktops") == ({}, [])
+    assert "desktops" not in group.bars["left"].modules
+
+
+def test_accessors_are_answered_by_the_first_bar(group):
+    assert execute(group, cmd="get_opt", key="-g") == ("1920x30+0+0", [])
+
+
+@pytest.mark.parametrize("bar", [None, "right"])
+def test_shared_commands_reload_every_bar(group, wallpapers, bar):
+    _, changes = wallpapers
+
+    assert execute(group, cmd="set_wallpaper", val="b.png", bar=bar) == ({}, ["left", "right"])
+
+    # Run once, on the shared wallpaper
+    assert changes == [str(wallpapers[0] / "b.png")]
+    assert all(bar.wallpaper.get_img() == "b.png" for bar in group.bars.values())
+
+
+def test_group_commands(group):
+    assert execute(group, cmd="get_bars") == ({"left": "1920x30+0+0", "right": "1920x30+1920+0"}, [])
+    assert "get_bars" in execute(group, cmd="list_commands")[0]
+
+
+def test_batch_reloads_each_bar_once(group):
+    reloads = []
+    for bar in group.bars.values():
+        bar.request_reload = lambda bar=bar: reloads.append(bar)
+
+    rep = asyncio.run(group.parse({"cmd": "batch", "val": [
+        {"cmd": "set_opt", "key": "-B", "val": "#111111"},
+        {"cmd": "set_opt", "key": "-F", "val": "#222222", "bar": "left"},
+        {"cmd": "update_mod", "key": "clock", "val": "x"},
+        "bogus",
+    ]}))
+
+    assert rep == {"replies": [{}, {}, {}, {"error": "Invalid command"}]}
+    assert sorted(bar.options["-g"] for bar in reloads) == ["1920x30+0+0", "1920x30+1920+0"]
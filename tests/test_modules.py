@@ -0,0 +1,101 @@
+import pytest
+
+from modules import ModuleRegistry
+
+
+def make():
+    return ModuleRegistry({
+        "left": {"a": "A", "b": "B"},
+        "right": {"c": "C"},
+    })
+
+
+def render(reg):
+    return reg.render(lambda val: val.lower())
+
+
+def test_render():
+    assert render(make()) == ("", "ab", "", "c")
+
+
+def test_update_rerenders_only_changes():
+    reg = make()
+    render(reg)
+
+    assert reg.update("a", "X")
+    assert not reg.update("a", "X")
+    assert reg.dirty == {"left"}
+    assert render(reg) == ("", "xb", "", "c")
+
+
+def test_add_remove():
+    reg = make()
+    reg.add("center", "d", "D")
+    reg.add("left", "e", "E", pos=0)
+    reg.remove("b")
+
+    assert render(reg) == ("", "ea", "d", "c")
+    assert reg.index["a"] == ("left", 1)
+    assert "b" not in reg
+
+
+def test_add_errors():
+    reg = make()
+
+    with pytest.raises(KeyError):
+        reg.add("left", "a")
+    with pytest.raises(KeyError):
+        reg.add("top", "d")
+    with pytest.raises(ValueError):
+        reg.add("left", "d", pos=3)
+
+
+def test_move():
+    reg = make()
+    reg.move("a", "right", 0)
+
+    assert render(reg) == ("", "b", "", "ac")
+    assert reg.index == {"a": ("right", 0), "b": ("left", 0), "c": ("right", 1)}
+
+    reg.move("a", "right")
+    assert reg.order["right"] == ["c", "a"]
+
+
+def test_move_within_section():
+    reg = make()
+    reg.move("a", "left", 1)
+
+    assert reg.order["left"] == ["b", "a"]
+    assert reg.index["a"] == ("left", 1)
+
+
+@pytest.mark.parametrize("section, pos, exc", [
+    ("top", None, KeyError),
+    ("right", 2, ValueError),
+    ("left", 2, ValueError),
+    ("right", -1, ValueError),
+    ("right", "0", TypeError),
+    ("right", 0.5, TypeError),
+])
+def test_move_invalid_changes_nothing(section, pos, exc):
+    reg = make()
+    before = (reg.to_dict(), dict(reg.index))
+
+    with pytest.raises(exc):
+        reg.move("a", section, pos)
+
+    assert (reg.to_dict(), reg.index) == before
+
+
+def test_move_unknown_module():
+    with pytest.raises(KeyError):
+        make().move("z", "left")
+
+
+def test_invalidate():
+    reg = make()
+    render(reg)
+    reg.invalidate()
+
+    assert not reg.fragments
+    assert render(reg) == ("", "ab", "", "c")
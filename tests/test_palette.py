@@ -0,0 +1,90 @@
+import sys
+import types
+
+import pytest
+
+import palette
+
+COLORS = {
+    "special": {"foreground": "#eeeeee", "background": "#111111"},
+    "colors": {"color1": "#ff0000"},
+}
+
+
+@pytest.fixture
+def pywal(monkeypatch):
+    """ A stand-in pywal, exiting (like pywal) on images named bad* """
+
+    calls = []
+
+    def get(img_path):
+        calls.append(img_path)
+        if "bad" in img_path:
+            sys.exit(1)
+        return COLORS
+
+    def change(img_path):
+        if "bad" in img_path:
+            sys.exit(1)
+
+    module = types.ModuleType("pywal")
+    module.colors = types.SimpleNamespace(get=get)
+    module.wallpaper = types.SimpleNamespace(change=change)
+    monkeypatch.setitem(sys.modules, "pywal", module)
+
+    return calls
+
+
+@pytest.fixture
+def wallpapers(tmp_path):
+    for name in ("bad.png", "good.png"):
+        (tmp_path / name).write_bytes(b"x")
+    return tmp_path
+
+
+def test_pywal_exit_becomes_value_error(pywal, wallpapers):
+    with pytest.raises(ValueError):
+        palette.get_colors(str(wallpapers / "bad.png"))
+    with pytest.raises(ValueError):
+        palette.change_wallpaper(str(wallpapers / "bad.png"))
+
+
+def test_build_palette_inserts_alpha():
+    assert palette.build_palette(COLORS, "D0") == {
+        "foreground": "#D0eeeeee", "background": "#D0111111", "color1": "#D0ff0000",
+    }
+
+
+def test_index_skips_failed_images(pywal, wallpapers):
+    index = palette.PaletteIndex(str(wallpapers), path=None)
+
+    index._compute(str(wallpapers / "bad.png"))
+    index._compute(str(wallpapers / "bad.png"))
+    index._compute(str(wallpapers / "good.png"))
+
+    assert pywal == [str(wallpapers / "bad.png"), str(wallpapers / "good.png")]
+    assert list(index.failed) == [str(wallpapers / "bad.png")]
+    assert all(index.random_img() == "good.png" for _ in range(10))
+
+
+def test_cache_failure_marks_image(pywal, wallpapers):
+    index = palette.PaletteIndex(str(wallpapers), path=None)
+    cache = palette.PaletteCache(index)
+
+    with pytest.raises(ValueError):
+        cache.get(str(wallpapers / "bad.png"), "FF")
+
+    assert str(wallpapers / "bad.png") in index.failed
+
+    cache.get(str(wallpapers / "good.png"), "FF")
+    cache.get(str(wallpapers / "good.png"), "FF")
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_no_usable_image(pywal, wallpapers):
+    index = palette.PaletteIndex(str(wallpapers), path=None)
+    index.mark_failed(str(wallpapers / "bad.png"))
+    index.mark_failed(str(wallpapers / "good.png"))
+
+    with pytest.raises(ValueError):
+        index.random_img()
@@ -0,0 +1,59 @@
+import pytest
+
+import protocol
+
+
+@pytest.mark.parametrize("req", [
+    {"cmd": "update_mod", "key": "clock", "val": "12:00 é"},
+    {"cmd": "move_mod", "key": "clock", "val": {"section": "left", "pos": 0}},
+    {"cmd": "get_mods", "key": None, "val": None},
+    {"cmd": "set_alpha", "key": None, "val": ""},
+])
+def test_binary_round_trip(req):
+    payload = protocol.encode_request(req, protocol.BINARY)
+
+    assert payload[0] == protocol.MAGIC
+    assert protocol.decode_request(payload) == (req, protocol.BINARY)
+
+
+def test_json_round_trip():
+    req = {"cmd": "update_mod", "key": "clock", "val": "12:00"}
+    payload = protocol.encode_request(req)
+
+    assert protocol.decode_request(payload) == (req, protocol.JSON)
+
+
+def test_bar_requests_are_json():
+    req = {"cmd": "update_mod", "key": "clock", "val": "x", "bar": "top"}
+
+    assert protocol.decode_request(protocol.encode_request(req, protocol.BINARY)) == (req, protocol.JSON)
+
+
+@pytest.mark.parametrize("fmt", [protocol.JSON, protocol.BINARY])
+@pytest.mark.parametrize("rep", [{}, {"error": "Unknown module: x"}, ["a", "b"], "12:00"])
+def test_reply_round_trip(fmt, rep):
+    assert protocol.decode_reply(protocol.encode_reply(rep, fmt)) == rep
+
+
+def test_empty_binary_reply_is_a_header():
+    assert protocol.encode_reply({}, protocol.BINARY) == protocol.EMPTY_REPLY
+    assert len(protocol.EMPTY_REPLY) == protocol.HEADER.size
+
+
+@pytest.mark.parametrize("payload", [
+    b"[1, 2]",
+    b"not json",
+    bytes((protocol.MAGIC, 1)),
+    protocol.encode_binary(len(protocol.COMMANDS)),
+    protocol.encode_binary(0),
+    protocol.HEADER.pack(protocol.MAGIC, 1, protocol.HAS_KEY, 1, 0) + b"\xff",
+])
+def test_malformed_requests(payload):
+    with pytest.raises(ValueError):
+        protocol.decode_request(payload)
+
+
+def test_command_ids_are_stable():
+    # Append only: existing clients rely on these
+    assert protocol.COMMANDS[:6] == (None, "update_mod", "add_mod", "remove_mod", "move_mod", "get_mods")
+    assert all(protocol.COMMANDS[i] == cmd for cmd, i in protocol.COMMAND_IDS.items())
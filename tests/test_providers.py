@@ -0,0 +1,69 @@
+import asyncio
+
+from providers import battery, run_provider, update_once
+
+
+class FakeBar:
+    def __init__(self, mods=("clock",)):
+        self.mods = set(mods)
+        self.values = []
+
+    def update_mod(self, mod_id, val):
+        if mod_id not in self.mods:
+            raise KeyError(f"Unknown module: { mod_id }")
+        self.values.append(val)
+
+    def flush_mods(self):
+        pass
+
+
+def test_polled_provider():
+    bar = FakeBar()
+
+    asyncio.run(update_once(bar, "clock", lambda: "12:00"))
+    asyncio.run(update_once(bar, "clock", lambda: None))
+
+    assert bar.values == ["12:00"]
+
+
+def test_failing_provider_restarts(capsys):
+    bar = FakeBar()
+    starts = []
+
+    async def provider():
+        starts.append(1)
+        yield "a"
+        if len(starts) < 3:
+            raise OSError("gone")
+        yield "b"
+
+    asyncio.run(asyncio.wait_for(
+        run_provider(bar, "clock", provider, backoff=0.01), 1))
+
+    assert bar.values == ["a", "a", "a", "b"]
+    assert capsys.readouterr().out.count("Provider clock failed: gone") == 2
+
+
+def test_unknown_module_is_logged(capsys):
+    async def provider():
+        yield "a"
+
+    async def main():
+        task = asyncio.create_task(run_provider(FakeBar(), "nope", provider, backoff=0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(main())
+
+    assert "Provider nope failed: 'Unknown module: nope'" in capsys.readouterr().out
+
+
+def test_battery(tmp_path):
+    (tmp_path / "BAT0").mkdir()
+    (tmp_path / "BAT0" / "capacity").write_text("42\n")
+    (tmp_path / "BAT0" / "status").write_text("Charging\n")
+
+    provide = battery(fmt="{capacity}% {status}", prefix="[", suffix="]", sysfs=str(tmp_path))
+
+    assert provide() == "[42% Charging]"
+    assert battery("BAT1", sysfs=str(tmp_path))() is None
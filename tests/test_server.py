@@ -0,0 +1,172 @@
+import json
+import asyncio
+
+import protocol
+from server import Server
+
+
+class FakeSock:
+    """ A ROUTER socket fed by the test """
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    def push(self, client, obj, fmt=protocol.JSON):
+        self.incoming.put_nowait([client, b"", protocol.encode_request(obj, fmt)])
+
+    async def recv_multipart(self):
+        return await self.incoming.get()
+
+    async def send_multipart(self, frames):
+        self.sent.append((frames[0], protocol.decode_reply(frames[-1])))
+
+
+def serve(requests, handler, wait=0.1, **kwargs):
+    """ Runs a Server over `requests` [(client, request)], returns (replies, server) """
+
+    async def main():
+        sock = FakeSock()
+        server = Server(sock, handler, **kwargs)
+        runner = asyncio.create_task(server.run())
+
+        for client, obj in requests:
+            sock.push(client, obj)
+        await asyncio.sleep(wait)
+
+        runner.cancel()
+        return sock.sent, server
+
+    return asyncio.run(main())
+
+
+def test_requests_of_a_client_run_in_order():
+    async def handler(obj):
+        # The first request is the slowest
+        await asyncio.sleep(0.03 if obj["key"] == "1" else 0)
+        return obj["key"]
+
+    sent, server = serve([(b"a", {"cmd": "get_opt", "key": str(i)}) for i in range(1, 4)], handler)
+
+    assert sent == [(b"a", "1"), (b"a", "2"), (b"a", "3")]
+    assert server.get_stats()["clients_pending"] == 0
+
+
+def test_clients_run_concurrently():
+    async def handler(obj):
+        await asyncio.sleep(0.03 if obj["key"] == "slow" else 0)
+        return obj["key"]
+
+    sent, server = serve([
+        (b"a", {"cmd": "get_opt", "key": "slow"}),
+        (b"b", {"cmd": "get_opt", "key": "fast"}),
+    ], handler)
+
+    assert sent == [(b"b", "fast"), (b"a", "slow")]
+    assert server.max_inflight == 2
+
+
+def test_max_inflight():
+    async def handler(obj):
+        await asyncio.sleep(0.01)
+        return {}
+
+    _, server = serve([(bytes([i]), {"cmd": "get_opt"}) for i in range(10)], handler, max_inflight=3)
+
+    assert server.max_inflight == 3
+
+
+def test_fast_path_from_idle_clients():
+    handled = []
+
+    async def handler(obj):
+        handled.append(obj["cmd"])
+        await asyncio.sleep(0.03 if obj["cmd"] == "get_opt" else 0)
+        return {}
+
+    _, server = serve([
+        (b"a", {"cmd": "update_mod", "key": "clock", "val": "1"}),
+        (b"b", {"cmd": "get_opt"}),
+        # Client b is busy: queued behind its get_opt
+        (b"b", {"cmd": "update_mod", "key": "clock", "val": "2"}),
+    ], handler)
+
+    assert handled == ["update_mod", "get_opt", "update_mod"]
+    assert (server.fast_path, server.queued) == (1, 2)
+
+
+def test_errors_are_replied():
+    async def handler(obj):
+        raise RuntimeError("boom")
+
+    async def main():
+        sock = FakeSock()
+        server = Server(sock, handler)
+        runner = asyncio.create_task(server.run())
+
+        sock.incoming.put_nowait([b"a", b"", b"{not json"])
+        sock.push(b"b", {"cmd": "get_opt"})
+        await asyncio.sleep(0.05)
+
+        runner.cancel()
+        return sock.sent
+
+    sent = dict(asyncio.run(main()))
+
+    assert sent[b"a"]["error"].startswith("Invalid message")
+    assert sent[b"b"] == {"error": "Internal error: boom"}
+
+
+def test_replies_in_the_request_format():
+    async def handler(obj):
+        return {"cmd": obj["cmd"]}
+
+    async def main():
+        sock = FakeSock()
+        raw = []
+
+        async def send(frames):
+            raw.append(frames[-1])
+
+        sock.send_multipart = send
+        server = Server(sock, handler)
+        runner = asyncio.create_task(server.run())
+
+        sock.push(b"a", {"cmd": "get_mods"}, protocol.BINARY)
+        sock.push(b"b", {"cmd": "get_mods"})
+        await asyncio.sleep(0.05)
+
+        runner.cancel()
+        return raw, server
+
+    raw, server = asyncio.run(main())
+
+    assert raw[0][0] == protocol.MAGIC
+    assert json.loads(raw[1]) == {"cmd": "get_mods"}
+    assert server.formats == {protocol.JSON: 1, protocol.BINARY: 1}
+
+
+def test_failed_reply_is_logged(capsys):
+    async def handler(obj):
+        return {}
+
+    async def main():
+        sock = FakeSock()
+
+        async def fail(frames):
+            raise OSError("socket closed")
+
+        sock.send_multipart = fail
+        server = Server(sock, handler)
+        runner = asyncio.create_task(server.run())
+
+        sock.push(b"a", {"cmd": "get_mods"})
+        await asyncio.sleep(0.05)
+
+        runner.cancel()
+        return server
+
+    server = asyncio.run(main())
+
+    assert not server.drains
+    assert "Request queue failed: socket closed" in capsys.readouterr().out
@@ -0,0 +1,109 @@
+import json
+import asyncio
+import importlib
+
+import state
+from state import StateWriter, load_state, restore_settings, save_state
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "cache" / "state.json")
+
+    save_state({"settings": {"img": "a.png"}}, path)
+
+    assert load_state(path) == {"settings": {"img": "a.png"}}
+    assert not (tmp_path / "cache" / "state.json.tmp").exists()
+
+
+def test_load_missing_or_corrupt(tmp_path):
+    (tmp_path / "bad.json").write_text("{")
+    (tmp_path / "list.json").write_text("[]")
+
+    assert load_state(str(tmp_path / "missing.json")) == {}
+    assert load_state(str(tmp_path / "bad.json")) == {}
+    assert load_state(str(tmp_path / "list.json")) == {}
+    assert load_state(None) == {}
+
+
+def test_restore_settings():
+    config = {"-g": "1920x30", "img": None, "alpha": "D0", "fonts": ["a"]}
+    saved = {
+        # The config as it was when the state was saved
+        "config": {"-g": "1920x30", "img": None, "alpha": "FF", "fonts": ["a"]},
+        "settings": {"-g": "1920x40", "img": "b.png", "alpha": "80"},
+    }
+
+    assert restore_settings(config, saved) == {
+        # Changed at runtime, same config: restored
+        "-g": "1920x40",
+        "img": "b.png",
+        # Edited in the config since: the new value wins
+        "alpha": "D0",
+        # Never saved
+        "fonts": ["a"],
+    }
+    assert restore_settings(config, {}) == config
+
+
+def test_default_path_is_per_display(monkeypatch):
+    try:
+        monkeypatch.setenv("DISPLAY", ":1")
+        assert importlib.reload(state).DEFAULT_STATE_PATH.endswith("state-1.json")
+
+        monkeypatch.setenv("DISPLAY", ":0.0")
+        assert importlib.reload(state).DEFAULT_STATE_PATH.endswith("state-0.0.json")
+    finally:
+        monkeypatch.undo()
+        importlib.reload(state)
+
+
+def test_writer_debounces(tmp_path):
+    path = tmp_path / "state.json"
+    snapshot = {"n": 0}
+
+    async def main():
+        writer = StateWriter(lambda: dict(snapshot), str(path), delay=0.02)
+
+        for i in range(5):
+            snapshot["n"] = i
+            writer.request()
+        await asyncio.sleep(0.05)
+
+        # Unchanged since the last write
+        writer.request()
+        await asyncio.sleep(0.05)
+
+        return writer
+
+    writer = asyncio.run(main())
+
+    assert json.loads(path.read_text()) == {"n": 4}
+    assert (writer.requested, writer.written, writer.unchanged) == (6, 1, 1)
+
+
+def test_writer_write_now(tmp_path):
+    path = tmp_path / "state.json"
+
+    async def main():
+        writer = StateWriter(lambda: {"n": 1}, str(path), delay=10)
+        writer.request()
+        writer.write()
+        return writer
+
+    writer = asyncio.run(main())
+
+    assert json.loads(path.read_text()) == {"n": 1}
+    assert writer.handle is None
+
+
+def test_writer_disabled(tmp_path):
+    async def main():
+        writer = StateWriter(lambda: {"n": 1}, None, delay=0)
+        writer.request()
+        writer.write()
+        return writer
+
+    writer = asyncio.run(main())
+
+    assert writer.written == 0
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from subscriptions import Handler, SubscriptionEngine
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_burst_runs_once_with_last_line():
+    lines = []
+
+    async def main():
+        handler = Handler(lines.append, debounce=0.02)
+
+        for i in range(10):
+            handler.trigger(str(i))
+        await asyncio.sleep(0.06)
+
+        return handler
+
+    handler = run(main())
+
+    assert lines == ["9"]
+    assert (handler.triggered, handler.runs) == (10, 1)
+    assert handler.task is None
+
+
+def test_events_during_debounce_dont_rerun():
+    lines = []
+
+    async def main():
+        handler = Handler(lines.append, debounce=0.03)
+
+        handler.trigger("a")
+        await asyncio.sleep(0.01)
+        handler.trigger("b")
+        await asyncio.sleep(0.08)
+
+    run(main())
+
+    assert lines == ["b"]
+
+
+def test_events_while_running_rerun_once():
+    lines = []
+
+    async def slow(line):
+        lines.append(line)
+        await asyncio.sleep(0.03)
+
+    async def main():
+        handler = Handler(slow, debounce=0.01)
+
+        handler.trigger("a")
+        await asyncio.sleep(0.02)
+        handler.trigger("b")
+        handler.trigger("c")
+        await asyncio.sleep(0.1)
+
+        return handler
+
+    handler = run(main())
+
+    assert lines == ["a", "c"]
+    assert handler.runs == 2
+
+
+def test_no_debounce():
+    lines = []
+
+    async def main():
+        handler = Handler(lines.append, debounce=0)
+        handler.trigger("a")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    run(main())
+
+    assert lines == ["a"]
+
+
+def test_engine_shares_handlers():
+    engine = SubscriptionEngine()
+
+    def callback(line):
+        pass
+
+    engine.subscribe(["bspc", "subscribe", "desktop"], callback)
+    engine.subscribe(["bspc", "subscribe", "node"], callback)
+    engine.subscribe(["bspc", "subscribe", "node"], ["echo", "x"])
+
+    assert len(engine.sources) == 2
+    assert len(engine.handlers) == 2
+    assert engine.sources[("bspc", "subscribe", "node")].handlers == list(engine.handlers.values())
+
+
+def test_failing_handler_is_logged_and_keeps_running(capsys):
+    calls = []
+
+    def callback(line):
+        calls.append(line)
+        raise OSError("gone")
+
+    async def main():
+        handler = Handler(callback, debounce=0.01)
+
+        handler.trigger("a")
+        await asyncio.sleep(0.03)
+        handler.trigger("b")
+        await asyncio.sleep(0.03)
+
+        return handler
+
+    handler = run(main())
+
+    assert calls == ["a", "b"]
+    assert handler.failed == 2
+    assert capsys.readouterr().out.count("Handler callback failed: gone") == 2
+
+
+def test_missing_command_is_logged(capsys):
+    async def main():
+        handler = Handler(["lemonbar-manager-no-such-command"], debounce=0)
+        handler.trigger("")
+        await asyncio.sleep(0.1)
+        return handler
+
+    assert run(main()).failed == 1
+    assert "Handler lemonbar-manager-no-such-command failed" in capsys.readouterr().out
+
+
+def test_shared_handler_rejects_another_debounce():
+    engine = SubscriptionEngine()
+
+    engine.subscribe(["bspc", "subscribe", "desktop"], ["echo", "x"], 0.1)
+    engine.subscribe(["bspc", "subscribe", "node"], ["echo", "x"], 0.1)
+
+    with pytest.raises(ValueError):
+        engine.subscribe(["bspc", "subscribe", "node"], ["echo", "x"])
+
+    assert engine.get_stats()["handlers"] == {"echo x": {"triggered": 0, "runs": 0, "failed": 0}}
@@ -0,0 +1,22 @@
+from template import compile_template, render, replace_colors
+
+
+def test_compile():
+    assert compile_template("a${color1}b") == ("a", "color1", "b")
+    assert compile_template("plain") == ("plain",)
+    assert compile_template("${x}${y}") == ("", "x", "", "y", "")
+
+
+def test_render():
+    palette = {"color1": "#D0FF0000", "foreground": "#D0FFFFFF"}
+
+    assert render(compile_template("%{F${color1}}x%{F-}"), palette) == "%{F#D0FF0000}x%{F-}"
+    assert replace_colors("${foreground}${color1}", palette) == "#D0FFFFFF#D0FF0000"
+
+
+def test_unknown_names_are_kept():
+    assert replace_colors("${nope} ${color1}", {"color1": "#1"}) == "${nope} #1"
+
+
+def test_literals_untouched():
+    assert replace_colors("$notaname {x} $", {}) == "$notaname {x} $"
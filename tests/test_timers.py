@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from timers import TimerScheduler
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def with_scheduler(body):
+    sched = TimerScheduler()
+    runner = asyncio.create_task(sched.run())
+
+    try:
+        await body(sched)
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+    return sched
+
+
+def test_runs_right_away_then_periodically():
+    runs = []
+
+    async def body(sched):
+        async def tick():
+            runs.append(asyncio.get_running_loop().time())
+
+        sched.add("tick", 0.05, tick, align=False)
+        await asyncio.sleep(0.22)
+
+    sched = run(with_scheduler(body))
+
+    assert 4 <= len(runs) <= 6
+    assert sched.jobs["tick"].runs == len(runs)
+    # Deadlines follow the schedule, without drifting
+    assert runs[-1] - runs[0] == pytest.approx(0.05 * (len(runs) - 1), abs=0.03)
+
+
+def test_slow_job_skips_instead_of_stacking():
+    running = []
+
+    async def body(sched):
+        async def slow():
+            running.append(1)
+            assert len(running) == 1
+            await asyncio.sleep(0.12)
+            running.pop()
+
+        sched.add("slow", 0.05, slow, align=False)
+        await asyncio.sleep(0.3)
+
+    job = run(with_scheduler(body)).jobs["slow"]
+
+    assert job.skipped > 0
+    assert 2 <= job.runs <= 3
+
+
+def test_remove_and_retune():
+    runs = {"a": 0, "b": 0}
+
+    async def body(sched):
+        def counter(name):
+            async def tick():
+                runs[name] += 1
+            return tick
+
+        sched.add("a", 0.03, counter("a"), align=False)
+        sched.add("b", 10, counter("b"), align=False)
+        await asyncio.sleep(0.01)
+
+        sched.remove("a")
+        sched.retune("b", 0.03)
+        await asyncio.sleep(0.1)
+
+        assert "a" not in sched.get_stats()
+
+    run(with_scheduler(body))
+
+    assert runs["a"] == 1
+    assert runs["b"] >= 3
+
+
+def test_failing_job_keeps_running():
+    runs = []
+
+    async def body(sched):
+        async def fail():
+            runs.append(1)
+            raise RuntimeError("boom")
+
+        sched.add("fail", 0.03, fail, align=False)
+        await asyncio.sleep(0.1)
+
+    run(with_scheduler(body))
+
+    assert len(runs) >= 3
+
+
+def test_invalid():
+    async def body(sched):
+        async def noop():
+            pass
+
+        sched.add("a", 1, noop)
+
+        with pytest.raises(KeyError):
+            sched.add("a", 1, noop)
+        with pytest.raises(ValueError):
+            sched.add("b", 0, noop)
+        with pytest.raises(KeyError):
+            sched.remove("b")
+        with pytest.raises(ValueError):
+            sched.retune("a", -1)
+
+    run(with_scheduler(body))